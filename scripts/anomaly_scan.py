@@ -0,0 +1,263 @@
+"""Anomaly scan over every city × metric × quarter of the published datasets.
+
+The ownership counts and areas, their 坪/棟 ratios and the default rate are
+laid out as one float array [metric, city code, period code] and checked in
+a single vectorized pass:
+
+* level  robust z-score against the trailing WINDOW quarters (median / MAD)
+* yoy    robust z-score of the change from the same quarter a year earlier
+* sum    the counties' total against the 全國 row (ownership volumes only)
+
+Counts, areas and ratios are scored on a log scale, the rate as is. Each
+check's score divided by its threshold is the severity; rows with severity
+>= 1 are anomalies, ranked by severity. verify_taoyuan_spike.py is one cell
+of this (桃園市 拍賣 坪/棟); the full history takes a few milliseconds, so the
+fetch steps run gate() on every ingest.
+
+    python scripts/anomaly_scan.py                     # ranked report, full history
+    python scripts/anomaly_scan.py --since 114Q1 --top 10
+    python scripts/anomaly_scan.py --gate              # exit 1 if the latest quarter has anomalies
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import cities
+import periods
+from columnar_store import DATASETS, read_dataset
+
+WINDOW = 12          # trailing quarters forming the baseline
+MIN_HISTORY = 8      # valid baseline quarters required before a point is scored
+Z_THRESHOLD = 6.0
+SUM_TOLERANCE = 0.001   # relative gap between the counties' total and 全國
+MIN_RATIO_UNITS = 10    # 坪/棟 of fewer units is too noisy to score
+
+# metric -> dataset and source column(s); a ratio divides the first column by
+# the second. Metrics with a ``unit`` are scored as log1p(value / unit), so
+# differences are relative changes and values well below one unit (a county
+# with a handful of auctions) count for little; points where both the value
+# and its baseline are below one unit are not scored. ``floor`` is the
+# smallest robust scale on that axis.
+_OWNERSHIP_TYPES = ["買賣", "拍賣", "繼承", "贈與"]
+METRICS = {}
+for _t in _OWNERSHIP_TYPES:
+    METRICS[f"{_t}_棟數"] = {"dataset": "building_ownership_trend", "columns": [f"{_t}_棟數"],
+                           "unit": 20, "floor": 0.05}
+    METRICS[f"{_t}_坪數"] = {"dataset": "building_ownership_trend", "columns": [f"{_t}_坪數"],
+                           "unit": 600, "floor": 0.05}
+for _t in _OWNERSHIP_TYPES:
+    METRICS[f"{_t}_坪/棟"] = {"dataset": "building_ownership_trend",
+                            "columns": [f"{_t}_坪數", f"{_t}_棟數"], "unit": 1, "floor": 0.05}
+METRICS["違約率(%)"] = {"dataset": "housing_loan_default_rate", "columns": ["本季購置住宅貸款違約率(%)"],
+                     "unit": None, "floor": 0.02}
+SUMMED = [m for m, spec in METRICS.items() if len(spec["columns"]) == 1 and spec["unit"]]
+
+REPORT_COLUMNS = ["期別", "縣市", "指標", "檢查", "數值", "基準", "分數", "嚴重度"]
+
+
+class Panel:
+    """values[metric, city code, period - first] for METRICS, NaN where a dataset has no row."""
+
+    def __init__(self, values, metrics, first):
+        self.values = values
+        self.metrics = metrics
+        self.first = first
+
+    @property
+    def periods(self):
+        return np.arange(self.first, self.first + self.values.shape[2], dtype=np.int16)
+
+
+def load_panel(frames=None):
+    """Panel of every metric; ``frames`` maps dataset -> frame as read_dataset(labels=False) returns it."""
+    datasets = list(dict.fromkeys(spec["dataset"] for spec in METRICS.values()))
+    if frames is None:
+        frames = {}
+    frames = {name: frames[name] if name in frames else read_dataset(name, labels=False)
+              for name in datasets}
+
+    keyed = {}
+    for name, df in frames.items():
+        spec = DATASETS[name]
+        city = cities.encode(df[spec["city"]])
+        keep = city != cities.UNKNOWN
+        keyed[name] = (df[keep], city[keep], df[spec["period"]].to_numpy()[keep])
+    first = min(int(p.min()) for _, _, p in keyed.values() if len(p))
+    last = max(int(p.max()) for _, _, p in keyed.values() if len(p))
+
+    metrics = list(METRICS)
+    values = np.full((len(metrics), len(cities.DIMENSION), last - first + 1), np.nan)
+    for m, metric in enumerate(metrics):
+        spec = METRICS[metric]
+        df, city, period = keyed[spec["dataset"]]
+        cols = [pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float) for c in spec["columns"]]
+        if len(cols) == 2:
+            area, units = cols
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cols = [np.where(units >= MIN_RATIO_UNITS, area / units, np.nan)]
+        values[m, city, period - first] = cols[0]
+    return Panel(values, metrics, first)
+
+
+def _trailing(x, window, start=0):
+    """Windows of the ``window`` values before positions ``start``.. of the last axis (NaN-padded)."""
+    padded = np.concatenate([np.full(x.shape[:-1] + (window,), np.nan), x], axis=-1)
+    return np.lib.stride_tricks.sliding_window_view(padded, window, axis=-1)[..., start:x.shape[-1], :]
+
+
+def _nanmedian(windows):
+    """Median over the last axis ignoring NaN, and the count of valid values."""
+    ordered = np.sort(windows, axis=-1)          # NaN sorts last
+    n = np.count_nonzero(~np.isnan(windows), axis=-1)
+    lo = np.take_along_axis(ordered, np.maximum((n - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    hi = np.take_along_axis(ordered, (n // 2)[..., None], axis=-1)[..., 0]
+    return np.where(n > 0, (lo + hi) / 2, np.nan), n
+
+
+def robust_z(x, floor, window=WINDOW, start=0, min_history=MIN_HISTORY):
+    """(z, baseline median) of series ``x[..., start:]`` against their trailing windows.
+
+    The scale is 1.4826 × MAD, but at least the series' ``floor`` so flat
+    series do not turn every small move into a huge score. Points with fewer
+    than ``min_history`` valid baseline values get NaN.
+    """
+    windows = _trailing(x, window, start)
+    median, n = _nanmedian(windows)
+    mad, _ = _nanmedian(np.abs(windows - median[..., None]))
+    z = (x[..., start:] - median) / np.maximum(1.4826 * mad, floor[:, None])
+    return np.where(n >= min_history, z, np.nan), median
+
+
+def _start(panel, since):
+    if since is None:
+        return 0
+    code = periods.parse(since) if isinstance(since, str) else int(since)
+    return min(max(0, code - panel.first), panel.values.shape[2])
+
+
+def scan(panel, threshold=Z_THRESHOLD, window=WINDOW, since=None):
+    """Ranked anomalies of ``panel`` as a DataFrame with REPORT_COLUMNS (periods from ``since`` on)."""
+    start = _start(panel, since)
+    raw = panel.values
+    specs = [METRICS[m] for m in panel.metrics]
+    unit = np.array([s["unit"] or 0 for s in specs], dtype=float)
+    floor = np.array([s["floor"] for s in specs])
+
+    # one row per (metric, city) series that has any data
+    metric, city = np.nonzero(~np.isnan(raw).all(axis=-1))
+    r = raw[metric, city]
+    unit, floor = unit[metric], floor[metric]
+    logged = (unit > 0)[:, None]
+    with np.errstate(invalid="ignore"):
+        x = np.where(logged, np.log1p(r / np.where(unit > 0, unit, 1)[:, None]), r)
+    prev = np.full_like(r, np.nan)
+    prev[:, 4:] = r[:, :-4]
+    yoy = np.full_like(x, np.nan)
+    yoy[:, 4:] = x[:, 4:] - x[:, :-4]
+
+    # level and yoy series scored together in one pass
+    z, median = robust_z(np.concatenate([x, yoy]), np.concatenate([floor, floor]), window, start)
+    n = len(r)
+    level_z, yoy_z, median = z[:n], z[n:], median[:n]
+    base = np.where(logged, np.expm1(median) * unit[:, None], median)
+    r, prev = r[:, start:], prev[:, start:]
+    found = [
+        ("level", np.where(np.fmax(r, base) < unit[:, None], np.nan, np.abs(level_z)) / threshold, base),
+        ("yoy", np.where(np.fmax(r, prev) < unit[:, None], np.nan, np.abs(yoy_z)) / threshold, prev),
+    ]
+
+    # counties against 全國 for the summed volumes
+    summed = np.flatnonzero(np.isin(metric, [panel.metrics.index(m) for m in SUMMED if m in panel.metrics])
+                            & (city == cities.TOTAL))
+    kind = cities.DIMENSION["kind"].to_numpy()
+    counties = np.flatnonzero((kind != "total") & (kind != "former"))
+    parts = np.nansum(raw[metric[summed]][:, counties, start:], axis=1)
+    total = r[summed]
+    sum_sev = np.full_like(r, np.nan)
+    sum_base = np.full_like(r, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sum_sev[summed] = np.where(total > 0, np.abs(parts / total - 1) / SUM_TOLERANCE, np.nan)
+    sum_base[summed] = parts
+    found.append(("sum", sum_sev, sum_base))
+
+    hits = []
+    for check, severity, baseline in found:
+        s, p = np.nonzero(np.nan_to_num(severity, nan=0.0) >= 1)
+        sev = severity[s, p]
+        hits.append(pd.DataFrame({
+            "period": panel.first + start + p, "city": city[s], "metric": metric[s], "check": check,
+            "value": r[s, p], "baseline": baseline[s, p],
+            "score": sev * (1 if check == "sum" else threshold), "severity": sev,
+        }))
+    out = pd.concat(hits, ignore_index=True).sort_values(
+        ["severity", "period"], ascending=[False, False], kind="stable")
+    return pd.DataFrame({
+        "期別": periods.roc_label(out["period"].to_numpy()),
+        "縣市": cities.labels(out["city"].to_numpy()),
+        "指標": np.asarray(panel.metrics, dtype=object)[out["metric"].to_numpy()],
+        "檢查": out["check"].to_numpy(),
+        "數值": out["value"].round(2).to_numpy(), "基準": out["baseline"].round(2).to_numpy(),
+        "分數": out["score"].round(1).to_numpy(), "嚴重度": out["severity"].round(2).to_numpy(),
+    }, columns=REPORT_COLUMNS)
+
+
+def latest_period(dataset):
+    """Code of the newest quarter in ``dataset``."""
+    df = read_dataset(dataset, columns=[], labels=False)
+    return int(df[DATASETS[dataset]["period"]].max())
+
+
+def gate(dataset, top=10):
+    """Scan after an ingest and print anomalies in ``dataset``'s newest quarter; never raises.
+
+    Returns the anomalies (empty when none or the scan failed).
+    """
+    try:
+        t0 = time.perf_counter()
+        latest = latest_period(dataset)
+        found = scan(load_panel(), since=latest)
+        found = found[found["指標"].map(lambda m: METRICS[m]["dataset"] == dataset)]
+        elapsed = time.perf_counter() - t0
+    except Exception as e:
+        print(f"異常掃描失敗：{e}")
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    label = periods.roc_label([latest])[0]
+    if found.empty:
+        print(f"異常掃描：{label} 無異常（{elapsed * 1000:.1f} ms）")
+    else:
+        print(f"異常掃描：{label} 發現 {len(found)} 筆異常（{elapsed * 1000:.1f} ms），前 {min(top, len(found))} 筆：")
+        print(found.head(top).to_string(index=False))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="掃描各縣市各指標各季的異常值並依嚴重度排序")
+    parser.add_argument("--since", help="只列出此期別（如 114Q1）之後的異常")
+    parser.add_argument("--top", type=int, default=30, help="列出前 N 筆（預設 30）")
+    parser.add_argument("--threshold", type=float, default=Z_THRESHOLD,
+                        help=f"robust z 門檻（預設 {Z_THRESHOLD:g}）")
+    parser.add_argument("--window", type=int, default=WINDOW, help=f"基準期間季數（預設 {WINDOW}）")
+    parser.add_argument("--gate", action="store_true", help="只檢查最新一季，有異常時結束代碼為 1")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    panel = load_panel()
+    t1 = time.perf_counter()
+    since = args.since
+    if args.gate:
+        since = int(panel.periods[-1])
+    found = scan(panel, threshold=args.threshold, window=args.window, since=since)
+    t2 = time.perf_counter()
+
+    print(f"掃描 {len(panel.metrics)} 項指標 × {panel.values.shape[1]} 縣市 × {panel.values.shape[2]} 季："
+          f"讀取 {(t1 - t0) * 1000:.1f} ms、掃描 {(t2 - t1) * 1000:.1f} ms，共 {len(found)} 筆異常")
+    if len(found):
+        print(found.head(args.top).to_string(index=False))
+    return 1 if args.gate and len(found) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
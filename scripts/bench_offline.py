@@ -0,0 +1,434 @@
+"""Offline benchmark suite: fetch, parse, merge, reshape and plot against a local stand-in server.
+
+A stand-in for statis.moi.gov.tw and E3030 runs on 127.0.0.1 and replays
+the recorded data: the E3030 page (debug_page.html), the E3030 CSV export
+(built from data/csv/housing_loan_default_rate.csv, Big5 like the real
+one) and statis responses for every registration type (built from
+data/csv/building_ownership_trend.csv, in the API's CSV layout). Requests
+can be delayed (--latency, --jitter) or failed (--failure-rate: statis and
+the E3030 page answer 503, the export answers with the recorded non-CSV
+page debug_download_response.html).
+
+History is scaled by appending copies of the recorded quarters after the
+newest one (values jittered by up to 10%), so the 10x and 100x runs go
+through the same code on about 700 and 7,000 quarters. The suite works in
+a scratch copy of the project, so data/ is never touched, and needs no
+network.
+
+    python scripts/bench_offline.py                                  # 1x, 10x and 100x
+    python scripts/bench_offline.py --scales 1 10 --only fetch parse
+    python scripts/bench_offline.py --latency 0.2 --jitter 0.1 --failure-rate 0.1 --json bench.jsonl
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPTS_DIR)
+PAGE_FIXTURE = os.path.join(PROJECT_ROOT, "debug_page.html")
+BAD_EXPORT_FIXTURE = os.path.join(PROJECT_ROOT, "debug_download_response.html")
+OWNERSHIP_CSV = os.path.join(PROJECT_ROOT, "data", "csv", "building_ownership_trend.csv")
+DEFAULT_RATE_CSV = os.path.join(PROJECT_ROOT, "data", "csv", "housing_loan_default_rate.csv")
+
+SCALES = [1, 10, 100]
+STATIS_PATH = "/micst/webMain.aspx"
+E3030_PATH = "/Publicize/Info/E3030"
+STATIS_HEADER = '"統計期/區域別","建物所有權登記棟數","建物所有權登記面積(平方公尺)"'
+STATIS_FOOTER = '"資料來源：內政部地政司"'
+# statis type code -> ownership column; 贈與 is published as 贈與 (6) plus 夫妻贈與 (7).
+TYPE_COLUMNS = {3: "買賣", 4: "拍賣", 5: "繼承", 6: "贈與", 7: "贈與"}
+SPOUSE_SHARE = 0.2
+M2_TO_PING = 0.3025
+INCREMENTAL_QUARTERS = 8   # quarters in the incremental merge benchmarks
+
+# Modules of the scratch copy, imported by load_modules().
+ftt = fap = metrics = periods = None
+
+
+# ── fixtures ───────────────────────────────────────────────────────────────
+
+def scale_history(df, period_col, scale, value_cols, seed=0):
+    """``scale`` copies of the recorded quarters, each one after the last; copies after the first are jittered.
+
+    ``value_cols`` maps each value column to its decimals (0 keeps integers).
+    """
+    codes = periods.encode(df[period_col])
+    span = int(codes.max()) - int(codes.min()) + 1
+    rng = np.random.default_rng(seed)
+    parts = []
+    for k in range(scale):
+        part = df.copy()
+        part[period_col] = periods.roc_label(codes + k * span)
+        if k:
+            noise = rng.uniform(0.9, 1.1, len(part))
+            for col, decimals in value_cols.items():
+                values = (part[col].to_numpy(dtype=float) * noise).round(decimals)
+                part[col] = values.astype(np.int64) if decimals == 0 else values
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _ym_code(ym):
+    return int(ym[:-2]) * 4 + (int(ym[-2:]) - 1) // 3
+
+
+class StatisFixture:
+    """statis responses for each registration type, sliced to the requested quarter range."""
+
+    def __init__(self, ownership):
+        codes = periods.encode(ownership["period"])
+        order = np.argsort(codes, kind="stable")
+        df = ownership.iloc[order].reset_index(drop=True)
+        self.codes = codes[order]
+        y, q = periods.split(self.codes)
+        prefix = pd.Series([f'"{a}年 第{b}季/' for a, b in zip(y.tolist(), q.tolist())]) + df["city"].astype(str) + '",'
+        self.lines = {}
+        for type_code, column in TYPE_COLUMNS.items():
+            share = SPOUSE_SHARE if type_code == 7 else (1 - SPOUSE_SHARE if column == "贈與" else 1.0)
+            count = (df[f"{column}_棟數"] * share).round().astype(np.int64)
+            area = (df[f"{column}_坪數"] * share / M2_TO_PING).round(2)
+            self.lines[type_code] = (prefix + count.astype(str) + "," + area.astype(str)).to_numpy()
+
+    def response(self, type_code, lo, hi):
+        a, b = np.searchsorted(self.codes, [lo, hi + 1])
+        return "\n".join([STATIS_HEADER, *self.lines[type_code][a:b], STATIS_FOOTER]) + "\n"
+
+
+def e3030_export(default_rate):
+    """The E3030 CSV export (Big5) for a default-rate history."""
+    rate = fap.RATE_COLUMN
+    text = default_rate[["資料期別", "縣市", rate]].to_csv(index=False, lineterminator="\r\n")
+    return text.encode("big5", errors="replace")
+
+
+# ── stand-in server ────────────────────────────────────────────────────────
+
+class StandInServer:
+    """statis and E3030 on 127.0.0.1 with injected latency and failures; counts requests and bytes."""
+
+    def __init__(self, statis, page, export, bad_export, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0):
+        self.statis = statis
+        self.page = page
+        self.export = export
+        self.bad_export = bad_export
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = self.failures = self.bytes = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def delay_and_fail(self):
+        """Sleep the injected latency; True when this request should fail."""
+        with self.lock:
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            fail = self.rng.random() < self.failure_rate
+            self.requests += 1
+            self.failures += fail
+        if delay:
+            time.sleep(delay)
+        return fail
+
+
+def _handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with server.lock:
+                server.bytes += len(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path not in (STATIS_PATH, E3030_PATH):
+                return self._send(404, b"Not Found", "text/plain")
+            if server.delay_and_fail():
+                return self._send(503, b"Service Unavailable", "text/plain")
+            if url.path == E3030_PATH:
+                return self._send(200, server.page, "text/html; charset=utf-8")
+            query = parse_qs(url.query)
+            type_code = int(query["codspc1"][0].split(",")[0])
+            body = server.statis.response(type_code, _ym_code(query["ym"][0]), _ym_code(query["ymt"][0]))
+            self._send(200, body.encode("utf-8"), "text/csv; charset=utf-8")
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if urlparse(self.path).path != E3030_PATH:
+                return self._send(404, b"Not Found", "text/plain")
+            if server.delay_and_fail():
+                return self._send(200, server.bad_export, "text/html; charset=utf-8")
+            self._send(200, server.export, "text/csv")
+
+    return Handler
+
+
+# ── measurement ────────────────────────────────────────────────────────────
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def measure(name, fn, repeat, units=None, setup=None, verbose=False):
+    """Time ``fn`` ``repeat`` times (``setup`` runs untimed first); HTTP calls come from metrics records."""
+    timings, calls, failures, error = [], [], 0, None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        metrics.drain()
+        out = sys.stdout if verbose else io.StringIO()
+        t0 = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(out):
+                fn()
+        except Exception as e:
+            failures += 1
+            error = str(e)
+        timings.append(time.perf_counter() - t0)
+        calls += metrics.drain("http")
+    median = statistics.median(timings)
+    latencies = [c["seconds"] for c in calls]
+    return {
+        "name": name,
+        "runs": repeat,
+        "failures": failures,
+        "error": error,
+        "median_s": round(median, 6),
+        "min_s": round(min(timings), 6),
+        "units": units,
+        "per_s": round(units / median, 1) if units and median else None,
+        "http_requests": len(calls),
+        "http_errors": sum(1 for c in calls if c["status"] is not None and c["status"] >= 400),
+        "http_bytes": sum(c["bytes"] for c in calls),
+        "http_p50_ms": round(_percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "http_p95_ms": round(_percentile(latencies, 95) * 1000, 2) if latencies else None,
+    }
+
+
+def _workspace():
+    """Scratch project: a copy of scripts/ and an empty data tree, so outputs never land in data/."""
+    root = tempfile.mkdtemp(prefix="taiwanhouse-bench-")
+    os.makedirs(os.path.join(root, "scripts"))
+    for name in os.listdir(SCRIPTS_DIR):
+        if name.endswith(".py"):
+            shutil.copy2(os.path.join(SCRIPTS_DIR, name), os.path.join(root, "scripts", name))
+    os.makedirs(os.path.join(root, "data", "csv"))
+    return root
+
+
+def load_modules(root):
+    global ftt, fap, metrics, periods
+    sys.path.insert(0, os.path.join(root, "scripts"))
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    ftt = importlib.import_module("fetch_transaction_trend")
+    fap = importlib.import_module("fetch_and_plot")
+    metrics = importlib.import_module("metrics")
+    periods = importlib.import_module("periods")
+
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+# ── benchmarks ─────────────────────────────────────────────────────────────
+
+def prepare(root, scale, args):
+    """Write the scaled fixtures into ``root``; returns what the benchmarks and the server need."""
+    ownership = scale_history(pd.read_csv(OWNERSHIP_CSV, encoding="utf-8-sig"), "period", scale,
+                              {c: (0 if c.endswith("_棟數") else 2) for c in ftt.METRIC_COLUMNS}, args.seed)
+    default_rate = scale_history(pd.read_csv(DEFAULT_RATE_CSV, encoding="utf-8-sig"), "資料期別", scale,
+                                 {fap.RATE_COLUMN: 2}, args.seed)
+    shutil.rmtree(os.path.join(root, "data", "parquet"), ignore_errors=True)
+    _write_csv(ownership, ftt.CSV_OUTPUT)
+
+    # The stored default rates lack the newest quarter, and the export revises the one before it.
+    codes = periods.encode(default_rate["資料期別"])
+    export = default_rate.copy()
+    revised = codes == codes.max() - 1
+    export.loc[revised, fap.RATE_COLUMN] = (export.loc[revised, fap.RATE_COLUMN] + 0.01).round(2)
+    stored_rates = os.path.join(root, "stored_default_rate.csv")
+    _write_csv(default_rate[codes < codes.max()], stored_rates)
+    shutil.copyfile(stored_rates, fap.CSV_OUTPUT)   # read by figure_jobs() whatever --only selects
+    export_path = os.path.join(root, "E3030_default_rate.csv")
+    with open(export_path, "wb") as f:
+        f.write(e3030_export(export))
+
+    statis = StatisFixture(ownership)
+    lo, hi = int(statis.codes[0]), int(statis.codes[-1])
+    raw = {name: ftt._parse_response_frame(statis.response(code, lo, hi))
+           for name, code in ftt.FETCH_TYPES.items()}
+    return {
+        "statis": statis,
+        "ym_start": periods.to_ym(lo),
+        "ym_end": periods.to_ym(hi),
+        "text": statis.response(3, lo, hi),
+        "raw": raw,
+        "recent": {name: df[periods.encode(df["period"]) > hi - INCREMENTAL_QUARTERS] for name, df in raw.items()},
+        "existing": ownership[periods.encode(ownership["period"]) <= hi - INCREMENTAL_QUARTERS // 2]
+                    .reset_index(drop=True),
+        "rows": len(ownership),
+        "rate_rows": len(default_rate),
+        "stored_rates": stored_rates,
+        "export_path": export_path,
+    }
+
+
+def benchmarks(fx, args):
+    """(name, fn, units, setup) for every benchmark; plots are listed once the data steps have run."""
+    def restore_rates():
+        shutil.copyfile(fx["stored_rates"], fap.CSV_OUTPUT)
+
+    def fetch_type_cities():
+        with ftt._make_session(1) as session:
+            ftt._fetch_type_cities(3, fx["ym_start"], fx["ym_end"], session=session)
+
+    def read_ownership():
+        return ftt._coded(ftt.read_dataset(ftt.DATASET, columns=ftt.METRIC_COLUMNS, labels=False))
+
+    rows, rate_rows = fx["rows"], fx["rate_rows"]
+    yield ("fetch statis（fetch_raw）", lambda: ftt.fetch_raw(args.workers, None, fx["ym_start"], fx["ym_end"]),
+           rows * len(ftt.FETCH_TYPES), None)
+    yield "_fetch_type_cities（請求＋解析）", fetch_type_cities, rows, None
+    yield "_parse_response_frame（解析）", lambda: ftt._parse_response_frame(fx["text"]), rows, None
+    yield "_assemble（download_data 組裝）", lambda: ftt._assemble(fx["raw"]), rows, None
+    yield "merge_data（增量合併寫入）", lambda: ftt.merge_data(fx["existing"], fx["recent"]), rows, None
+    yield "fetch E3030（download_csv_direct）", fap.download_csv_direct, rate_rows, None
+    yield ("merge_download（download_csv 合併）", lambda: fap.merge_download(fx["export_path"]),
+           rate_rows, restore_rates)
+    yield "default_rate_frame（pivot_table）", fap.default_rate_frame, rate_rows, None
+    yield "read_dataset（建物登記）", read_ownership, rows, None
+    coded = read_ownership()
+    coded = coded[np.isin(coded["city"].to_numpy(), ftt.TARGET_CODES)]
+    yield "reshape_cities（建物登記）", lambda: ftt.reshape_cities(coded), len(coded), None
+    for renderer in args.renderers:
+        for module in (fap, ftt):
+            with contextlib.redirect_stdout(io.StringIO()):
+                jobs = module.figure_jobs(renderer=renderer)
+            for job in jobs:
+                yield (f"{job.render.__name__}（{job.name}，{renderer}）",
+                       lambda job=job: job.render(*job.args, **job.params, output_path=job.output),
+                       None, None)
+
+
+def run_scale(root, scale, args, server_options):
+    """Every selected benchmark at one history scale; returns the result dicts."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        fx = prepare(root, scale, args)
+    with open(PAGE_FIXTURE, "rb") as f:
+        page = f.read()
+    with open(BAD_EXPORT_FIXTURE, "rb") as f:
+        bad_export = f.read()
+    with open(fx["export_path"], "rb") as f:
+        export = f.read()
+
+    results = []
+    statis = fx["statis"]
+    with StandInServer(statis, page, export, bad_export, seed=args.seed, **server_options) as server:
+        ftt.BASE_API = server.url + STATIS_PATH
+        fap.BASE_URL = server.url + E3030_PATH
+        print(f"\n規模 {scale}x：{fx['rows']:,} 列建物登記、{fx['rate_rows']:,} 列違約率、"
+              f"{statis.codes[-1] - statis.codes[0] + 1:,} 季（伺服器 {server.url}）")
+        print(f"  {metrics.pad('項目', 50)}{'':4}中位數{'':5}最快{'':4}每秒列數{'HTTP p50/p95 (ms)':>20}{'':2}失敗")
+        for name, fn, units, setup in benchmarks(fx, args):
+            if args.only and not any(key.lower() in name.lower() for key in args.only):
+                continue
+            result = measure(name, fn, args.repeat, units=units, setup=setup, verbose=args.verbose)
+            result["scale"] = scale
+            results.append(result)
+            latency = (f"{result['http_p50_ms']:.1f}/{result['http_p95_ms']:.1f}"
+                       if result["http_p50_ms"] is not None else "")
+            rate = f"{result['per_s']:,.0f}" if result["per_s"] else ""
+            failed = f"{result['failures']}/{result['runs']}" if result["failures"] else ""
+            print(f"  {metrics.pad(name, 50)}{result['median_s'] * 1000:8.1f}ms{result['min_s'] * 1000:7.1f}ms"
+                  f"{rate:>12}{latency:>20}{failed:>6}")
+        print(f"  伺服器：{server.requests} 個請求、{server.failures} 個注入失敗、{server.bytes:,} bytes")
+    return results
+
+
+def print_scaling(results, scales):
+    """Median time of each benchmark at every scale, and its growth from the smallest scale."""
+    if len(scales) < 2:
+        return
+    by_name = {}
+    for r in results:
+        by_name.setdefault(r["name"], {})[r["scale"]] = r["median_s"]
+    print(f"\n各規模中位數（ms）與相對 {scales[0]}x 的倍數：")
+    print(f"  {metrics.pad('項目', 50)}" + "".join(f"{f'{s}x':>10}" for s in scales) + f"{'':4}倍數")
+    for name, timings in by_name.items():
+        cells = "".join(f"{timings[s] * 1000:10.1f}" if s in timings else f"{'—':>10}" for s in scales)
+        first, last = timings.get(scales[0]), timings.get(scales[-1])
+        growth = f"{last / first:7.1f}x" if first and last else ""
+        print(f"  {metrics.pad(name, 50)}{cells}{growth}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="歷史資料倍數（預設 1 10 100）")
+    parser.add_argument("--repeat", type=int, default=3, help="每個項目重複次數（取中位數）")
+    parser.add_argument("--workers", type=int, default=5, help="fetch_raw 並行請求數（預設 5）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每個請求的固定延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="每個請求額外的隨機延遲上限（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="注入失敗的請求比例（0–1）")
+    parser.add_argument("--renderers", nargs="+", choices=("native", "matplotlib"),
+                        default=["native", "matplotlib"], help="要量測的繪圖方式")
+    parser.add_argument("--only", nargs="+", help="只執行名稱包含任一關鍵字的項目")
+    parser.add_argument("--seed", type=int, default=0, help="合成資料與失敗注入的亂數種子")
+    parser.add_argument("--json", help="將結果以 JSON lines 附加至此檔案")
+    parser.add_argument("--keep", action="store_true", help="保留暫存專案目錄")
+    parser.add_argument("--verbose", action="store_true", help="顯示受測函式的輸出")
+    args = parser.parse_args(argv)
+
+    root = _workspace()
+    print(f"暫存專案：{root}")
+    try:
+        load_modules(root)
+        server_options = {"latency": args.latency, "jitter": args.jitter, "failure_rate": args.failure_rate}
+        results = []
+        for scale in args.scales:
+            results += run_scale(root, scale, args, server_options)
+        print_scaling(results, args.scales)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps({**r, **server_options}, ensure_ascii=False) + "\n")
+        print(f"結果已附加至 {args.json}")
+    return 1 if any(r["failures"] for r in results) and not args.failure_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
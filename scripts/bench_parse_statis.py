@@ -0,0 +1,75 @@
+"""Benchmark: per-line vs bulk (vectorized) parser of the statis.moi.gov.tw response.
+
+Builds a synthetic multi-year, all-city response in the API's CSV layout
+("98年 第1季/新北市",count,area_m2), checks that the bulk parser returns the
+same rows as the per-line one and prints both timings. The default 17
+years (98Q1 to now) is the size of a real full-history response.
+
+    python scripts/bench_parse_statis.py --years 17 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fetch_transaction_trend as ftt  # noqa: E402
+
+CITIES = ["區域別總計", "新北市", "臺北市", "桃園市", "臺中市", "臺南市", "高雄市",
+          "宜蘭縣", "新竹縣", "苗栗縣", "彰化縣", "南投縣", "雲林縣", "嘉義縣",
+          "屏東縣", "臺東縣", "花蓮縣", "澎湖縣", "基隆市", "新竹市", "嘉義市",
+          "金門縣", "連江縣"]
+LEGACY = ["臺北縣(改制前)", "臺中縣", "臺南縣", "高雄縣", "桃園縣"]
+
+
+def synthetic_response(years, seed=0):
+    rng = random.Random(seed)
+    lines = ['"統計期/區域別","建物所有權登記棟數","建物所有權登記面積(平方公尺)"']
+    for roc_y in range(98, 98 + years):
+        for q in range(1, 5):
+            for city in CITIES + (LEGACY if roc_y < 100 else []):
+                count = rng.randint(0, 20000)
+                area = round(count * rng.uniform(60, 200), 2)
+                # Sprinkle in the odd cells the real API emits ("-", blanks, 台 spellings).
+                if rng.random() < 0.002:
+                    area = "-"
+                name = city.replace("臺北", "台北") if rng.random() < 0.01 else city
+                lines.append(f'"{roc_y}年 第{q}季/{name}",{count},{area}')
+    lines.append('"資料來源：內政部地政司"')
+    return "\n".join(lines) + "\n"
+
+
+def best_of(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(text)
+        timings.append(time.perf_counter() - t0)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=17, help="合成資料的年數")
+    parser.add_argument("--repeat", type=int, default=5, help="每個解析器重複次數（取最佳）")
+    args = parser.parse_args(argv)
+
+    text = synthetic_response(args.years)
+    rows = text.count("\n")
+    print(f"合成回應：{args.years} 年、{rows:,} 行、{len(text.encode('utf-8')):,} bytes")
+
+    t_dict, ref = best_of(ftt._parse_response, text, args.repeat)
+    t_bulk, got = best_of(ftt._parse_response_frame, text, args.repeat)
+    if ftt._frame_to_dict(got) != ref:
+        print("錯誤：兩種解析結果不一致")
+        return 1
+
+    print(f"  逐行解析  ：{t_dict * 1000:8.1f} ms")
+    print(f"  整批讀取  ：{t_bulk * 1000:8.1f} ms（{t_dict / t_bulk:.1f}x）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Benchmark: cold-start import cost of each taiwanhouse subcommand and update script.
+
+Every measurement runs a fresh interpreter that imports what the target loads
+before its first request or figure (a subcommand: its parser and its
+datasets' modules), and reports the time and whether matplotlib or selenium
+were loaded. matplotlib.pyplot and selenium alone are timed for reference.
+
+    python scripts/bench_startup.py --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = (
+    "import sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "{code}\n"
+    "print(time.perf_counter() - t0, 'matplotlib' in sys.modules, 'selenium' in sys.modules)\n"
+)
+
+
+def targets():
+    out = []
+    for command in ("fetch", "plot", "report", "all"):
+        for dataset in ("default-rate", "ownership"):
+            out.append((f"taiwanhouse {command} {dataset}",
+                        f"import taiwanhouse; taiwanhouse.build_parser({command!r}, [{dataset!r}]); "
+                        f"taiwanhouse._module({dataset!r})"))
+    out += [
+        ("fetch_and_plot.py", "import fetch_and_plot"),
+        ("fetch_transaction_trend.py", "import fetch_transaction_trend"),
+        ("matplotlib.pyplot", "import matplotlib.pyplot"),
+        ("selenium webdriver", "from selenium import webdriver"),
+    ]
+    return out
+
+
+def time_import(code):
+    env = dict(os.environ, PYTHONPATH=SCRIPTS_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    out = subprocess.run([sys.executable, "-c", PROBE.format(code=code)], env=env,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[-3]), out[-2] == "True", out[-1] == "True"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="每個項目重複次數（取最佳）")
+    args = parser.parse_args(argv)
+
+    print(f"{'項目':<34}{'匯入耗時':>10}  matplotlib  selenium")
+    for label, code in targets():
+        try:
+            runs = [time_import(code) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError:
+            print(f"{label:<34}{'無法匯入':>10}")
+            continue
+        best = min(t for t, _, _ in runs)
+        mpl, sel = runs[0][1:]
+        print(f"{label:<34}{best * 1000:>8.0f}ms  {'已載入' if mpl else '未載入':<10}  "
+              f"{'已載入' if sel else '未載入'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Canonical city dimension: one integer code per county/city and every spelling of it.
+
+Each row holds the official name (臺), the spelling each source publishes
+(statis.moi.gov.tw uses 臺 and 區域別總計, the E3030 files 台 and 全國), the
+English name, a kind, and for the counties and cities merged away since
+2010 the code of their successor.
+
+encode() maps names to codes as one categorical lookup: each distinct name
+is resolved once, including pre-merger forms such as "臺北縣(改制前)".
+Unknown names get UNKNOWN. Filters and joins then compare small integers.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+TOTAL = 0
+UNKNOWN = -1
+
+# code, official name, English name, kind, successor code
+_ROWS = [
+    (0, "全國", "Taiwan", "total", None),
+    (1, "新北市", "New Taipei City", "municipality", None),
+    (2, "臺北市", "Taipei City", "municipality", None),
+    (3, "桃園市", "Taoyuan City", "municipality", None),
+    (4, "臺中市", "Taichung City", "municipality", None),
+    (5, "臺南市", "Tainan City", "municipality", None),
+    (6, "高雄市", "Kaohsiung City", "municipality", None),
+    (7, "宜蘭縣", "Yilan County", "county", None),
+    (8, "新竹縣", "Hsinchu County", "county", None),
+    (9, "苗栗縣", "Miaoli County", "county", None),
+    (10, "彰化縣", "Changhua County", "county", None),
+    (11, "南投縣", "Nantou County", "county", None),
+    (12, "雲林縣", "Yunlin County", "county", None),
+    (13, "嘉義縣", "Chiayi County", "county", None),
+    (14, "屏東縣", "Pingtung County", "county", None),
+    (15, "臺東縣", "Taitung County", "county", None),
+    (16, "花蓮縣", "Hualien County", "county", None),
+    (17, "澎湖縣", "Penghu County", "county", None),
+    (18, "基隆市", "Keelung City", "city", None),
+    (19, "新竹市", "Hsinchu City", "city", None),
+    (20, "嘉義市", "Chiayi City", "city", None),
+    (21, "金門縣", "Kinmen County", "county", None),
+    (22, "連江縣", "Lienchiang County", "county", None),
+    (23, "臺北縣", "Taipei County", "former", 1),
+    (24, "桃園縣", "Taoyuan County", "former", 3),
+    (25, "臺中縣", "Taichung County", "former", 4),
+    (26, "臺南縣", "Tainan County", "former", 5),
+    (27, "高雄縣", "Kaohsiung County", "former", 6),
+    (28, "臺中市(改制前)", "Taichung City (pre-2010)", "former", 4),
+    (29, "臺南市(改制前)", "Tainan City (pre-2010)", "former", 5),
+    (30, "高雄市(改制前)", "Kaohsiung City (pre-2010)", "former", 6),
+]
+# Where a source's spelling is not the official name with 臺 or 台.
+_TOTAL_SPELLINGS = {"statis": "區域別總計", "e3030": "全國"}
+
+DIMENSION = pd.DataFrame(_ROWS, columns=["code", "name", "english", "kind", "successor"]).set_index("code")
+DIMENSION["successor"] = DIMENSION["successor"].astype("Int8")
+DIMENSION["statis"] = DIMENSION["name"]
+DIMENSION["e3030"] = DIMENSION["name"].str.replace("臺", "台")
+for _source, _spelling in _TOTAL_SPELLINGS.items():
+    DIMENSION.loc[TOTAL, _source] = _spelling
+
+SPELLINGS = ("name", "statis", "e3030", "english")
+_ALIASES = {"總計": TOTAL}
+for _col in SPELLINGS:
+    _ALIASES.update(zip(DIMENSION[_col], DIMENSION.index))
+_LABELS = {col: DIMENSION[col].tolist() for col in SPELLINGS}
+FORMER = frozenset(DIMENSION.index[DIMENSION["kind"] == "former"].tolist())
+
+# "臺北縣(改制前)", "臺中市(99年12月24日改制前)": a name qualified as pre-merger.
+_PRE_MERGER_RE = re.compile(r"^(.+?)\s*[(（][^)）]*(?:改制|\d+年)[^)）]*[)）]$")
+
+
+def _predecessor(code):
+    if DIMENSION.at[code, "kind"] == "former":
+        return code
+    own = _ALIASES.get(DIMENSION.at[code, "name"] + "(改制前)")
+    if own is not None:
+        return own
+    former = DIMENSION.index[DIMENSION["successor"] == code]
+    return int(former[0]) if len(former) else UNKNOWN
+
+
+def resolve(name):
+    """Code for one name in any spelling; UNKNOWN if it is not a county or city."""
+    name = str(name).strip()
+    code = _ALIASES.get(name)
+    if code is not None:
+        return code
+    m = _PRE_MERGER_RE.match(name)
+    if m and m.group(1) in _ALIASES:
+        return _predecessor(_ALIASES[m.group(1)])
+    return UNKNOWN
+
+
+def encode(names):
+    """Names -> int16 codes, resolving each distinct name once."""
+    if isinstance(names, pd.Series) and isinstance(names.dtype, pd.CategoricalDtype):
+        uniques = names.cat.categories
+        inverse = names.cat.codes.to_numpy()
+    else:
+        inverse, uniques = pd.factorize(np.asarray(names, dtype=object))
+    table = np.array([resolve(u) for u in uniques] + [UNKNOWN], dtype=np.int16)
+    return table[inverse]
+
+
+def codes_of(names):
+    """Codes for a short list of names, e.g. a script's target cities."""
+    return np.array([resolve(n) for n in names], dtype=np.int16)
+
+
+def label(code, spelling="name"):
+    """Scalar :func:`labels`, for per-row code paths."""
+    return _LABELS[spelling][code] if code >= 0 else None
+
+
+def labels(codes, spelling="name"):
+    """Codes -> names in ``spelling`` ('name', 'statis', 'e3030' or 'english'); UNKNOWN -> None."""
+    table = np.append(DIMENSION[spelling].to_numpy(dtype=object), None)
+    codes = np.asarray(codes)
+    return table[np.where(codes >= 0, codes, len(table) - 1)]
+
+
+def is_former(codes):
+    """True for counties and cities merged into another since 2010."""
+    return np.isin(codes, list(FORMER))
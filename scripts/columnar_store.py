@@ -0,0 +1,290 @@
+"""Typed Parquet copies of the data/csv datasets, in row groups of 8 ROC years.
+
+The CSVs stay the published export. After each CSV write the same rows are
+stored as ``data/parquet/<dataset>.parquet`` with the int16 period code of
+periods.py (roc_year * 4 + quarter - 1), a dictionary-encoded city and
+int32 counts.
+Readers load only the requested columns and periods (sorted by period) and
+fall back to the CSV when pyarrow is missing or the copy no longer matches
+the CSV. Each copy records the hash of the CSV it mirrors and that CSV's
+size and mtime; the CSV is only hashed again when those differ.
+
+    python scripts/columnar_store.py            # rebuild every copy from data/csv
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+import periods
+from common import PROJECT_ROOT, file_sha256
+
+CSV_DIR = os.path.join(PROJECT_ROOT, "data", "csv")
+PARQUET_DIR = os.path.join(PROJECT_ROOT, "data", "parquet")
+ROW_GROUP_YEARS = 8
+SOURCE_KEY = b"taiwanhouse.source_sha256"   # Parquet metadata: hash of the CSV it mirrors
+STAMP_KEY = b"taiwanhouse.source_stat"      # ... and that CSV's "size:mtime_ns" at write time
+
+# Areas and rates stay float64: float32 keeps ~7 significant digits, which
+# drops the cents from national area totals (3,741,968.16 坪) and turns a
+# 0.30 % default rate into 0.3000000119 (> the 0.3 risk threshold).
+DATASETS = {
+    "building_ownership_trend": {
+        "period": "period", "city": "city",
+        "columns": {
+            "買賣_棟數": "int32", "買賣_坪數": "float64",
+            "拍賣_棟數": "int32", "拍賣_坪數": "float64",
+            "繼承_棟數": "int32", "繼承_坪數": "float64",
+            "贈與_棟數": "int32", "贈與_坪數": "float64",
+        },
+    },
+    "housing_loan_default_rate": {
+        "period": "資料期別", "city": "縣市",
+        "columns": {
+            "本季購置住宅貸款違約率(%)": "float64",
+            "download_timestamp": "category",
+            "process_timestamp": "category",
+        },
+    },
+    "taiwan_building_transfer_count": {
+        "period": "資料期別", "city": "縣市",
+        "columns": {"建物買賣移轉登記棟數": "int32"},
+    },
+}
+
+
+def csv_path(name):
+    return os.path.join(CSV_DIR, f"{name}.csv")
+
+
+def parquet_path(name):
+    return os.path.join(PARQUET_DIR, f"{name}.parquet")
+
+
+_SOURCE_HASHES = {}   # CSV path -> ("size:mtime_ns", sha256)
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}".encode("ascii")
+
+
+def _source_sha256(path):
+    """SHA-256 of ``path``, re-hashed only when its size or mtime changed."""
+    stamp = _stamp(path)
+    cached = _SOURCE_HASHES.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = file_sha256(path)
+    _SOURCE_HASHES[path] = (stamp, digest)
+    return digest
+
+
+def _read_source_csv(name, usecols=None):
+    spec = DATASETS[name]
+    return pd.read_csv(csv_path(name), encoding="utf-8-sig", usecols=usecols,
+                       dtype={spec["period"]: str, spec["city"]: str},
+                       float_precision="round_trip")
+
+
+def _value_columns(spec):
+    return list(spec["columns"])
+
+
+def _typed(name, df):
+    """CSV-shaped frame -> the store's dtypes (period as int16 code)."""
+    spec = DATASETS[name]
+    out = pd.DataFrame({
+        spec["period"]: periods.encode(df[spec["period"]]),
+        spec["city"]: df[spec["city"]].astype(str).astype("category"),
+    })
+    for col, dtype in spec["columns"].items():
+        if col not in df:
+            continue
+        if dtype == "category":
+            out[col] = df[col].astype(str).astype("category")
+        else:
+            out[col] = pd.to_numeric(df[col]).astype(dtype)
+    return out
+
+
+def _labelled(name, typed):
+    """Store dtypes -> what consumers expect: 'NNNQn' period labels, categorical city."""
+    period_col = DATASETS[name]["period"]
+    typed[period_col] = periods.roc_label(typed[period_col].to_numpy())
+    return typed
+
+
+def write_dataset(name, df=None):
+    """Write the typed copy of ``name``; ``df`` defaults to the current CSV.
+
+    Returns the Parquet path, or None when pyarrow is unavailable or the CSV
+    lacks the expected columns (readers then keep using the CSV).
+    """
+    if not HAS_PYARROW:
+        return None
+    source = csv_path(name)
+    if df is None:
+        df = _read_source_csv(name)
+    spec = DATASETS[name]
+    missing = [c for c in [spec["period"], spec["city"]] + _value_columns(spec) if c not in df]
+    if missing:
+        print(f"略過 Parquet 輸出（{name} 缺少欄位：{', '.join(missing)}）")
+        return None
+
+    typed = _typed(name, df)
+    typed = (typed[typed[spec["period"]] >= 0]
+             .sort_values(spec["period"], kind="stable").reset_index(drop=True))
+    table = pa.Table.from_pandas(typed, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        STAMP_KEY: _stamp(source),
+        SOURCE_KEY: _source_sha256(source).encode("ascii"),
+    })
+
+    # Row groups hold whole ROC-year blocks, so period filters skip them via
+    # their min/max statistics. Per-year groups would be ~90 rows each, where
+    # the per-group overhead costs more than the pruning saves.
+    target = parquet_path(name)
+    blocks = typed[spec["period"]].to_numpy() // (4 * ROW_GROUP_YEARS)
+    bounds = np.flatnonzero(np.diff(blocks)) + 1
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    tmp = target + ".tmp"
+    with pq.ParquetWriter(tmp, table.schema, compression="zstd") as writer:
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(typed)]):
+            writer.write_table(table.slice(lo, hi - lo))
+    os.replace(tmp, target)
+    return target
+
+
+def _open_current(name):
+    """The ParquetFile for ``name`` if it mirrors the CSV as it is now, else None."""
+    if not HAS_PYARROW:
+        return None
+    try:
+        pf = pq.ParquetFile(parquet_path(name))
+    except (OSError, pa.ArrowException):
+        return None
+    meta = pf.schema_arrow.metadata or {}
+    source = csv_path(name)
+    # Hashing the CSV costs about as much as reading it, so skip that while the
+    # CSV still has the size and mtime it had when the copy was written. A
+    # fresh checkout resets mtimes: the first read then hashes it once.
+    if meta.get(STAMP_KEY) == _stamp(source) and SOURCE_KEY in meta:
+        return pf
+    if meta.get(SOURCE_KEY) != _source_sha256(source).encode("ascii"):
+        return None
+    return pf
+
+
+def is_current(name):
+    """True when the Parquet copy was written from the CSV as it is now."""
+    return _open_current(name) is not None
+
+
+def _read_parquet(pf, name, columns, start, end):
+    period_col = DATASETS[name]["period"]
+    col_idx = pf.schema_arrow.get_field_index(period_col)
+    groups = []
+    for i in range(pf.num_row_groups):
+        stats = pf.metadata.row_group(i).column(col_idx).statistics
+        if stats is not None and stats.has_min_max and (
+                (start is not None and stats.max < start) or (end is not None and stats.min > end)):
+            continue
+        groups.append(i)
+    df = pf.read_row_groups(groups, columns=columns).to_pandas()
+    if start is None and end is None:
+        return df
+    codes = df[period_col]
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= codes >= start
+    if end is not None:
+        mask &= codes <= end
+    return df[mask].reset_index(drop=True)
+
+
+def _read_csv(name, columns, start, end):
+    spec = DATASETS[name]
+    typed = _typed(name, _read_source_csv(name, usecols=columns))
+    codes = typed[spec["period"]]
+    mask = codes >= 0
+    if start is not None:
+        mask &= codes >= start
+    if end is not None:
+        mask &= codes <= end
+    return typed[mask].sort_values(spec["period"], kind="stable").reset_index(drop=True)
+
+
+def read_dataset(name, columns=None, start=None, end=None, labels=True):
+    """Load ``name`` with CSV column names, limited to ``columns`` and periods in [start, end].
+
+    ``start`` / ``end`` are period labels such as '113Q1' or period codes. The
+    period and city columns are always included; periods come back as
+    'NNNQn' labels (int16 codes with ``labels=False``) and the city as a
+    categorical.
+    """
+    spec = DATASETS[name]
+    keys = [spec["period"], spec["city"]]
+    wanted = keys + [c for c in (columns or _value_columns(spec)) if c not in keys]
+    lo = periods.parse(start) if isinstance(start, str) else start
+    hi = periods.parse(end) if isinstance(end, str) else end
+
+    pf = _open_current(name)
+    if pf is not None:
+        df = _read_parquet(pf, name, wanted, lo, hi)
+    else:
+        df = _read_csv(name, wanted, lo, hi)
+    return _labelled(name, df) if labels else df
+
+
+def _best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由 data/csv 重建 Parquet 欄式副本並比較讀取效能")
+    parser.add_argument("datasets", nargs="*", default=list(DATASETS), help="資料集名稱（預設全部）")
+    args = parser.parse_args(argv)
+
+    if not HAS_PYARROW:
+        print("未安裝 pyarrow，無法輸出 Parquet（讀取端會自動改讀 CSV）。")
+        return 1
+
+    for name in args.datasets:
+        if not os.path.exists(csv_path(name)):
+            print(f"略過 {name}：找不到 {csv_path(name)}")
+            continue
+        target = write_dataset(name)
+        if target is None:
+            continue
+        size = os.path.getsize(target)
+
+        t_csv, from_csv = _best_of(lambda: pd.read_csv(csv_path(name), encoding="utf-8-sig"))
+        t_parquet, from_parquet = _best_of(lambda: read_dataset(name))
+        print(f"{name}：{len(from_parquet):,} 筆")
+        print(f"  檔案大小  CSV {os.path.getsize(csv_path(name)):>9,} bytes  "
+              f"Parquet {size:>9,} bytes")
+        print(f"  記憶體    CSV {from_csv.memory_usage(deep=True).sum():>9,} bytes  "
+              f"Parquet {from_parquet.memory_usage(deep=True).sum():>9,} bytes")
+        print(f"  讀取時間  CSV {t_csv * 1000:7.1f} ms        Parquet {t_parquet * 1000:7.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Paths, the README updater, the pyplot loader and a file hash shared by the update scripts and scripts/taiwanhouse.py.
+
+Paths are anchored at the repository (the parent of scripts/), not the
+current directory, so the scripts can be run from anywhere.
+"""
+import hashlib
+import os
+import re
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPTS_DIR)
+DATA_DIR = os.path.join(PROJECT_ROOT, "data", "csv")
+SVG_DIR = os.path.join(PROJECT_ROOT, "data", "svg")
+CACHE_ROOT = os.path.join(PROJECT_ROOT, ".cache")
+README_PATH = os.path.join(PROJECT_ROOT, "README.md")
+
+
+def file_sha256(path):
+    """Hex SHA-256 of the file's bytes; None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def pyplot():
+    """Import pyplot on first use, so fetch-only runs never load matplotlib."""
+    import matplotlib
+    matplotlib.use("Agg")   # headless — must be before pyplot import
+    import matplotlib.pyplot as plt
+    return plt
+
+
+_UPDATE_TIME_RE = re.compile(r"^Update time: \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} CST$")
+_HEADING_RE = re.compile(r"^#{1,3} ")
+
+
+def update_readme_timestamp(sections, readme_path=README_PATH):
+    """Put a fresh "Update time: ... CST" line above the image of each README section.
+
+    ``sections`` are (header, image_prefix) pairs. Only the timestamp line
+    changes: the one between the header and the image is replaced in place,
+    or, if there is none, inserted above the image with a blank line after
+    it. A section whose image is missing (before the next heading of level
+    3 or higher) is left alone.
+    """
+    import pytz
+    from datetime import datetime
+
+    timestamp_str = datetime.now(pytz.timezone("Asia/Taipei")).strftime(
+        "Update time: %Y-%m-%d %H:%M:%S CST")
+    if not os.path.exists(readme_path):
+        return
+
+    with open(readme_path, "r", encoding="utf-8", newline="") as f:
+        content = f.read()
+    newline = "\r\n" if "\r\n" in content else "\n"
+    lines = content.splitlines()
+
+    for header, image_prefix in sections:
+        start = next((i for i, line in enumerate(lines) if line.strip() == header), None)
+        if start is None:
+            continue
+        end = next((i for i in range(start + 1, len(lines)) if _HEADING_RE.match(lines[i])), len(lines))
+        image = next((i for i in range(start + 1, end) if lines[i].strip().startswith(image_prefix)), None)
+        if image is None:
+            print(f"README 找不到 {header} 的圖表，未更新時間戳")
+            continue
+        stamp = next((i for i in range(image - 1, start, -1) if _UPDATE_TIME_RE.match(lines[i].strip())), None)
+        if stamp is not None:
+            lines[stamp] = timestamp_str
+        else:
+            lines[image:image] = [timestamp_str, ""]
+
+    with open(readme_path, "w", encoding="utf-8", newline="") as f:
+        f.write(newline.join(lines) + (newline if content.endswith(("\n", "\r")) else ""))
+    print(f"README 已更新：{timestamp_str}")
@@ -1,42 +1,130 @@
+import argparse
+import base64
+import codecs
+import io
+import json
 import os
 import sys
+import threading
 import time
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import shutil
-import re
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
-import matplotlib.font_manager as fm
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import requests
+import urllib3
+
+import common
+from common import DATA_DIR, SVG_DIR
+from columnar_store import is_current, read_dataset, write_dataset
+from font_cache import resolve_cjk_font
+from render_cache import (FigureJob, add_render_arguments, check_render_arguments,
+                          render_figures, render_options)
+from svg_compact import save_figure
+import anomaly_scan
+import cities
+import metrics
+import periods
+import svg_charts
+from upsert_store import upsert_csv
+import warehouse
 
 try:
-    from selenium_stealth import stealth
-    HAS_STEALTH = True
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    HAS_WATCHDOG = True
 except ImportError:
-    HAS_STEALTH = False
+    HAS_WATCHDOG = False
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Set up paths
 BASE_URL = "https://pip.moi.gov.tw/Publicize/Info/E3030"
-PROJECT_ROOT = os.getcwd()
-DATA_DIR = os.path.join(PROJECT_ROOT, "data", "csv")
-SVG_DIR = os.path.join(PROJECT_ROOT, "data", "svg")
 DOWNLOAD_DIR = os.path.join(DATA_DIR, "temp_download")
-CSV_OUTPUT = os.path.join(DATA_DIR, "housing_loan_default_rate.csv")
+DATASET = "housing_loan_default_rate"
+CSV_OUTPUT = os.path.join(DATA_DIR, f"{DATASET}.csv")
 
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(SVG_DIR, exist_ok=True)
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+
+TARGET_TEXT = "本季購置住宅貸款違約率"
+RATE_COLUMN = TARGET_TEXT + "(%)"
+RISK_THRESHOLD = 0.3
+TARGET_CODES = cities.codes_of(['桃園市', '新竹市', '新竹縣', '苗栗縣', '台北市', '新北市', '台中市', '台南市', '高雄市'])
+CHART_TITLE = "Quarterly Housing Loan Default Rate - Major Cities\n(主要城市購置住宅貸款違約率)"
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+REJECTED_SIGNALS = [
+    "request rejected",
+    "the requested url was rejected",
+    "access denied",
+    "forbidden",
+    "security policy",
+]
+SNIFF_BYTES = 64 * 1024             # prefix inspected to pick a CSV encoding
+CHUNK_THRESHOLD = 8 * 1024 * 1024   # CSVs larger than this are parsed in chunks
+CHUNK_ROWS = 50_000
+_ENCODING_CACHE = {}                # source -> encoding that last parsed it
+
+
+# Resource types the scraper never needs; blocked over CDP in --lean mode.
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.eot", "*.otf", "*.mp4",
+    "*google-analytics.com*", "*googletagmanager.com*", "*facebook.net*",
+    "*doubleclick.net*",
+]
+
+# Replays the anchor's click handler (post form1 with T/K/N) with fetch() and
+# hands the CSV bytes back base64-encoded, so nothing goes through DOWNLOAD_DIR.
+IN_PAGE_FETCH_JS = """
+(async (target) => {
+    const link = Array.from(document.querySelectorAll("a")).find(
+        a => (a.title || "").includes(target) && a.textContent.includes("CSV"));
+    if (!link) return {error: "not-found"};
+    const form = new FormData(document.getElementById("form1"));
+    form.set("Command", "匯出CSV檔");
+    form.set("T", link.dataset.keyt);
+    form.set("K", link.dataset.keyk);
+    form.set("N", link.dataset.keyn);
+    const resp = await fetch("/Publicize/Info/E3030", {
+        method: "POST", body: new URLSearchParams(form), credentials: "same-origin"});
+    const bytes = new Uint8Array(await resp.arrayBuffer());
+    let binary = "";
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    return {status: resp.status, title: link.title, body: btoa(binary)};
+})(%s)
+"""
 
 
-def setup_driver():
+class RequestRejected(RuntimeError):
+    """The source site answered with a WAF / access-denied page."""
+
+
+def setup_driver(lean=False):
+    # selenium is imported here so that HTTP-only runs never load it.
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+    try:
+        from selenium_stealth import stealth
+    except ImportError:
+        stealth = None
+
     # Docker containers may restrict /tmp for Chrome; use /var/tmp instead
     os.environ.setdefault("TMPDIR", "/var/tmp")
 
     chrome_options = Options()
+    if lean:
+        # Return from driver.get() at DOMContentLoaded; the anchors are all we need.
+        chrome_options.page_load_strategy = "eager"
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--user-data-dir=/var/tmp/chrome-data-fetch")
     chrome_options.add_argument("--no-sandbox")
@@ -44,11 +132,7 @@ def setup_driver():
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--remote-allow-origins=*")
     chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument(
-        "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/124.0.0.0 Safari/537.36"
-    )
+    chrome_options.add_argument(f"--user-agent={USER_AGENT}")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_argument("--ignore-certificate-errors")
 
@@ -74,7 +158,7 @@ def setup_driver():
         )
         driver = webdriver.Chrome(service=service, options=chrome_options)
 
-    if HAS_STEALTH:
+    if stealth is not None:
         stealth(
             driver,
             languages=["zh-TW", "zh", "en-US", "en"],
@@ -89,139 +173,448 @@ def setup_driver():
             "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
         })
 
+    if lean:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
+
     return driver
 
 
+def is_rejected_text(text):
+    text = (text or "").lower()
+    return any(signal in text for signal in REJECTED_SIGNALS)
+
+
 def is_rejected_page(driver):
-    text = ((driver.page_source or "") + " " + (driver.title or "")).lower()
-    rejected_signals = [
-        "request rejected",
-        "the requested url was rejected",
-        "access denied",
-        "forbidden",
-        "security policy",
-    ]
-    return any(signal in text for signal in rejected_signals)
+    return is_rejected_text((driver.page_source or "") + " " + (driver.title or ""))
+
+
+class E3030PageParser(HTMLParser):
+    """Collects the ``form1`` fields and every anchor (attributes + text) of E3030."""
+
+    def __init__(self):
+        super().__init__()
+        self.form_fields = {}
+        self.links = []
+        self._in_form = False
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and attrs.get("id") == "form1":
+            self._in_form = True
+        elif tag == "input" and self._in_form and attrs.get("name"):
+            self.form_fields[attrs["name"]] = attrs.get("value") or ""
+        elif tag == "a":
+            self._link = {"attrs": attrs, "text": ""}
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._in_form = False
+        elif tag == "a" and self._link is not None:
+            self.links.append(self._link)
+            self._link = None
+
+    def handle_data(self, data):
+        if self._link is not None:
+            self._link["text"] += data
+
+
+def find_csv_link(links, target_text=TARGET_TEXT):
+    for link in links:
+        title = link["attrs"].get("title") or ""
+        if target_text in title and "CSV" in link["text"]:
+            return link
+    return None
+
+
+def _looks_like_csv(content):
+    head = content[:2048].decode("utf-8", errors="ignore").lstrip("\ufeff \r\n").lower()
+    return bool(head) and not head.startswith(("<!doctype", "<html", "<?xml")) and "," in head
+
+
+def _request(session, method, url, **kwargs):
+    t0 = time.perf_counter()
+    r = session.request(method, url, **kwargs)
+    metrics.http("e3030", url, r.status_code, time.perf_counter() - t0, len(r.content), method=method)
+    return r
+
+
+def download_csv_direct():
+    """Fetch the E3030 CSV bytes without a browser. Raises RequestRejected on WAF pages."""
+    with requests.Session() as session:
+        session.headers.update({"User-Agent": USER_AGENT, "Referer": BASE_URL})
+        print(f"前往資料來源（HTTP）：{BASE_URL}")
+        r = _request(session, "GET", BASE_URL, timeout=30, verify=False)
+        if r.status_code in (401, 403) or is_rejected_text(r.text):
+            raise RequestRejected(f"HTTP {r.status_code}")
+        r.raise_for_status()
+
+        parser = E3030PageParser()
+        parser.feed(r.text)
+        link = find_csv_link(parser.links)
+        if link is None:
+            raise RuntimeError(f"找不到「{TARGET_TEXT}」CSV 下載連結。")
+        attrs = link["attrs"]
+        print(f"找到連結：{attrs.get('title')}")
+
+        # The page's click handler posts form1 with T/K/N taken from the anchor.
+        form = dict(parser.form_fields)
+        form.update({
+            "Command": "匯出CSV檔",
+            "T": attrs.get("data-keyt", ""),
+            "K": attrs.get("data-keyk", ""),
+            "N": attrs.get("data-keyn", ""),
+        })
+        resp = _request(session, "POST", BASE_URL, data=form, timeout=60, verify=False)
+        if not _looks_like_csv(resp.content) and attrs.get("href"):
+            resp = _request(session, "GET", urljoin(BASE_URL, attrs["href"]), timeout=60, verify=False)
+        if not _looks_like_csv(resp.content):
+            text = resp.content.decode("utf-8", errors="replace")
+            if resp.status_code in (401, 403) or is_rejected_text(text):
+                raise RequestRejected(f"HTTP {resp.status_code}")
+            raise RuntimeError(f"下載內容不是 CSV（HTTP {resp.status_code}）。")
+    return resp.content
 
 
 def clear_download_dir():
+    """Create DOWNLOAD_DIR, or empty it; only the click-and-watch download uses it."""
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
     for f in os.listdir(DOWNLOAD_DIR):
         file_path = os.path.join(DOWNLOAD_DIR, f)
         if os.path.isfile(file_path):
             os.remove(file_path)
 
 
-def wait_for_download(timeout=30):
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        files = [f for f in os.listdir(DOWNLOAD_DIR) if f.endswith('.csv')]
-        if files:
-            if not any(f.endswith('.crdownload') for f in os.listdir(DOWNLOAD_DIR)):
-                return os.path.join(DOWNLOAD_DIR, files[0])
-        time.sleep(1)
+def finished_download():
+    names = os.listdir(DOWNLOAD_DIR)
+    files = [f for f in names if f.endswith('.csv')]
+    if files and not any(f.endswith('.crdownload') for f in names):
+        return os.path.join(DOWNLOAD_DIR, files[0])
     return None
 
 
-def read_csv_auto(path):
-    for encoding in ("utf-8", "utf-8-sig", "big5", "cp950"):
-        try:
-            return pd.read_csv(path, encoding=encoding)
-        except Exception:
-            continue
-    raise RuntimeError(f"無法讀取 CSV：{path}")
+class DownloadWatcher:
+    """Wakes up on filesystem events in DOWNLOAD_DIR (inotify/FSEvents via watchdog).
 
+    Must be entered before the download is triggered so no event is missed.
+    Without watchdog it falls back to polling every POLL_INTERVAL seconds.
+    """
 
-def download_csv():
-    """Download CSV with retry logic. Returns True if fresh data obtained."""
-    last_error = None
-    for attempt in range(1, 4):
-        driver = None
-        try:
-            print(f"初始化 WebDriver...（第 {attempt} 次嘗試）")
-            driver = setup_driver()
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, directory=None):
+        self.directory = directory or DOWNLOAD_DIR
+        self._changed = threading.Event()
+        self._observer = None
 
-            print(f"前往資料來源：{BASE_URL}")
-            driver.get(BASE_URL)
-            WebDriverWait(driver, 25).until(
-                lambda d: d.find_elements(By.TAG_NAME, "a")
-            )
+    def __enter__(self):
+        if HAS_WATCHDOG:
+            changed = self._changed
 
-            if is_rejected_page(driver):
-                raise RuntimeError("來源網站拒絕請求（Request Rejected / Access Denied）。")
+            class _Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    changed.set()
 
-            print("搜尋目標 CSV 下載連結...")
-            target_text = "本季購置住宅貸款違約率"
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), self.directory, recursive=False)
+            self._observer.start()
+        return self
 
-            links = driver.find_elements(By.TAG_NAME, "a")
-            target_link = None
+    def __exit__(self, *exc):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
 
-            for link in links:
-                title = link.get_attribute("title")
-                if title and target_text in title and "CSV" in link.text:
-                    target_link = link
-                    print(f"找到連結：{title}")
-                    break
+    def wait(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            path = finished_download()
+            if path:
+                return path
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            interval = remaining if self._observer is not None else self.POLL_INTERVAL
+            self._changed.wait(min(interval, remaining))
+            self._changed.clear()
 
-            if not target_link:
-                raise RuntimeError(f"找不到「{target_text}」CSV 下載連結。")
 
-            clear_download_dir()
+class BrowserSession:
+    """One Chrome instance shared by every download attempt.
 
-            print("點擊下載連結...")
-            driver.execute_script(
-                "arguments[0].scrollIntoView({block: 'center'});", target_link
-            )
-            time.sleep(1)
+    ``reset()`` clears cookies and navigates away between retries; the browser is
+    only relaunched when the previous instance is no longer responding.
+    """
+
+    def __init__(self, lean=False):
+        self.lean = lean
+        self.driver = None
+        self.launches = 0
+
+    def _alive(self):
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def get(self):
+        if self.driver is not None and not self._alive():
+            self.quit()
+        if self.driver is None:
+            t0 = time.perf_counter()
+            with metrics.stage("chrome_start", lean=self.lean):
+                self.driver = setup_driver(lean=self.lean)
+            self.launches += 1
+            print(f"WebDriver 啟動耗時 {time.perf_counter() - t0:.2f}s")
+        return self.driver
+
+    def reset(self):
+        if self.driver is None:
+            return
+        try:
+            self.driver.delete_all_cookies()
+            self.driver.get("about:blank")
+        except Exception:
+            self.quit()
+
+    def quit(self):
+        if self.driver is not None:
             try:
-                target_link.click()
+                self.driver.quit()
             except Exception:
-                driver.execute_script("arguments[0].click();", target_link)
+                pass
+            self.driver = None
 
-            downloaded_file = wait_for_download()
-            if downloaded_file is None:
-                raise RuntimeError("資料檔下載逾時。")
 
-            print(f"已下載：{downloaded_file}")
+def is_default_rate_column(name):
+    """Period, city and rate columns of an E3030 export (names vary between releases)."""
+    return any(key in name for key in ("期別", "季", "Year", "縣市", "City", "Region", "率", "Rate"))
+
+
+def sniff_encoding(sample):
+    """Return the first of the encodings MOI has used that decodes ``sample``, or None.
+
+    ``sample`` may be a bounded prefix, so a multibyte character cut off at the
+    end is not treated as an error.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    for encoding in ("utf-8", "big5", "cp950"):
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def read_csv_auto(path, usecols=None, chunksize=None):
+    """Read a CSV path, or raw CSV bytes, in one parse with a sniffed encoding.
+
+    The encoding comes from the BOM or a SNIFF_BYTES prefix and is remembered
+    per source. Only if the parse still hits an undecodable byte is the whole
+    file sniffed and parsed again. Files over CHUNK_THRESHOLD bytes (or any
+    file when ``chunksize`` is given) are read in chunks; combine this with
+    ``usecols`` (e.g. is_default_rate_column) to keep only the needed columns.
+    """
+    is_bytes = isinstance(path, bytes)
+    label = "<下載內容>" if is_bytes else path
+    key = "<bytes>" if is_bytes else os.path.abspath(path)
+    if chunksize is None and not is_bytes and os.path.getsize(path) > CHUNK_THRESHOLD:
+        chunksize = CHUNK_ROWS
+
+    def parse(encoding):
+        source = io.BytesIO(path) if is_bytes else path
+        result = pd.read_csv(source, encoding=encoding, usecols=usecols, chunksize=chunksize)
+        if chunksize is None:
+            return result
+        with result as reader:
+            return pd.concat(reader, ignore_index=True)
+
+    encoding = _ENCODING_CACHE.get(key)
+    if encoding is None:
+        if is_bytes:
+            sample = path[:SNIFF_BYTES]
+        else:
+            with open(path, "rb") as f:
+                sample = f.read(SNIFF_BYTES)
+        encoding = sniff_encoding(sample)
+    if encoding is not None:
+        try:
+            df = parse(encoding)
+            _ENCODING_CACHE[key] = encoding
+            return df
+        except UnicodeDecodeError:
+            pass
+
+    # The prefix (or the remembered encoding) was misleading: sniff everything.
+    _ENCODING_CACHE.pop(key, None)
+    if is_bytes:
+        data = path
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+    full = sniff_encoding(data)
+    if full is None or full == encoding:
+        raise RuntimeError(f"無法判斷 CSV 編碼：{label}")
+    df = parse(full)
+    _ENCODING_CACHE[key] = full
+    return df
+
+
+def _fetch_csv_in_page(driver):
+    print("以頁面內 fetch() 取得 CSV...")
+    t0 = time.perf_counter()
+    reply = driver.execute_cdp_cmd("Runtime.evaluate", {
+        "expression": IN_PAGE_FETCH_JS % json.dumps(TARGET_TEXT),
+        "awaitPromise": True,
+        "returnByValue": True,
+    })
+    if "exceptionDetails" in reply:
+        raise RuntimeError(f"頁面內下載失敗：{reply['exceptionDetails'].get('text')}")
+    value = reply["result"].get("value") or {}
+    if value.get("error") == "not-found":
+        raise RuntimeError(f"找不到「{TARGET_TEXT}」CSV 下載連結。")
+    print(f"找到連結：{value.get('title')}")
+
+    content = base64.b64decode(value.get("body", ""))
+    metrics.http("e3030_in_page", BASE_URL, value.get("status"), time.perf_counter() - t0, len(content))
+    if not _looks_like_csv(content):
+        if is_rejected_text(content.decode("utf-8", errors="replace")):
+            raise RuntimeError("來源網站拒絕請求（Request Rejected / Access Denied）。")
+        raise RuntimeError(f"下載內容不是 CSV（HTTP {value.get('status')}）。")
+    print(f"取得 {len(content):,} bytes，耗時 {time.perf_counter() - t0:.2f}s")
+    return content
+
+
+def _download_with_driver(driver, lean=False):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    print(f"前往資料來源：{BASE_URL}")
+    with metrics.stage("page_wait"):
+        driver.get(BASE_URL)
+        WebDriverWait(driver, 25).until(
+            lambda d: d.find_elements(By.TAG_NAME, "a")
+        )
+
+    if is_rejected_page(driver):
+        raise RuntimeError("來源網站拒絕請求（Request Rejected / Access Denied）。")
 
-            # Merge or replace
-            if os.path.exists(CSV_OUTPUT):
-                print("合併既有資料...")
-                df_old = read_csv_auto(CSV_OUTPUT)
-                df_new = read_csv_auto(downloaded_file)
+    if lean:
+        return _fetch_csv_in_page(driver)
 
-                time_col_new = [c for c in df_new.columns if '期別' in c or '季' in c or 'Year' in c][0]
-                region_col_new = [c for c in df_new.columns if '縣市' in c or 'City' in c or 'Region' in c][0]
+    print("搜尋目標 CSV 下載連結...")
+    links = driver.find_elements(By.TAG_NAME, "a")
+    target_link = None
 
-                time_col_old = [c for c in df_old.columns if '期別' in c or '季' in c or 'Year' in c][0]
-                region_col_old = [c for c in df_old.columns if '縣市' in c or 'City' in c or 'Region' in c][0]
+    for link in links:
+        title = link.get_attribute("title")
+        if title and TARGET_TEXT in title and "CSV" in link.text:
+            target_link = link
+            print(f"找到連結：{title}")
+            break
+
+    if not target_link:
+        raise RuntimeError(f"找不到「{TARGET_TEXT}」CSV 下載連結。")
 
-                df_new = df_new.rename(columns={time_col_new: '資料期別', region_col_new: '縣市'})
-                df_old = df_old.rename(columns={time_col_old: '資料期別', region_col_old: '縣市'})
+    clear_download_dir()
 
-                df_combined = pd.concat([df_old, df_new], ignore_index=True)
-                df_combined = df_combined.drop_duplicates(subset=['資料期別', '縣市'], keep='last')
+    print("點擊下載連結...")
+    driver.execute_script(
+        "arguments[0].scrollIntoView({block: 'center'});", target_link
+    )
+    with DownloadWatcher() as watcher, metrics.stage("download_poll"):
+        t0 = time.perf_counter()
+        try:
+            target_link.click()
+        except Exception:
+            driver.execute_script("arguments[0].click();", target_link)
+        downloaded_file = watcher.wait()
+
+    if downloaded_file is None:
+        raise RuntimeError("資料檔下載逾時。")
+    print(f"點擊至下載完成耗時 {time.perf_counter() - t0:.2f}s")
+    return downloaded_file
+
+
+def _column(df, *needles):
+    return next(c for c in df.columns if any(n in c for n in needles))
+
+
+def merge_download(downloaded_file):
+    """Upsert the download into CSV_OUTPUT by (資料期別, 縣市), writing only new or revised rows."""
+    df_new = read_csv_auto(downloaded_file, usecols=is_default_rate_column)
+    df_new = df_new.rename(columns={
+        _column(df_new, '期別', '季', 'Year'): '資料期別',
+        _column(df_new, '縣市', 'City', 'Region'): '縣市',
+        _column(df_new, '率', 'Rate'): RATE_COLUMN,
+    })
+    # One spelling per county, so a 臺/台 switch at the source is not a new key.
+    city_codes = cities.encode(df_new['縣市'])
+    df_new['縣市'] = np.where(city_codes == cities.UNKNOWN, df_new['縣市'].astype(str).str.strip(),
+                            cities.labels(city_codes, 'e3030'))
+    counts = upsert_csv(CSV_OUTPUT, df_new, ['資料期別', '縣市'], [RATE_COLUMN], period='資料期別')
+    print(f"合併完成：新增 {counts['inserted']} 筆、修訂 {counts['changed']} 筆、"
+          f"未變更 {counts['unchanged']} 筆")
+    metrics.record("rows", DATASET, fetched=len(df_new), **counts)
+    unchanged = not counts['inserted'] and not counts['changed']
+    if unchanged:
+        print(f"資料未變更，未改寫 {CSV_OUTPUT}")
+    if not (unchanged and is_current(DATASET)):
+        parquet = write_dataset(DATASET)
+        if parquet:
+            print(f"欄式副本已儲存：{parquet}")
+
+
+def download_csv(engine="auto", lean=False):
+    """Download CSV with retry logic. Returns True if fresh data obtained.
+
+    engine: "http" (no browser), "selenium", or "auto" — plain HTTP first and
+    Selenium only once the site rejects the direct request. ``lean`` makes the
+    browser skip non-essential resources and fetch the CSV in-page.
+    """
+    browser = BrowserSession(lean=lean)
+    try:
+        return _download_with_retries(engine, browser)
+    finally:
+        browser.quit()
 
-                # Add timestamps for freshness tracking
-                import datetime
-                process_ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S CST")
-                df_combined["download_timestamp"] = process_ts
-                df_combined["process_timestamp"] = process_ts
 
-                df_combined.to_csv(CSV_OUTPUT, index=False, encoding='utf-8-sig')
-                print(f"合併完成：{CSV_OUTPUT}（共 {len(df_combined)} 筆）")
-            else:
-                shutil.move(downloaded_file, CSV_OUTPUT)
-                print(f"檔案已儲存：{CSV_OUTPUT}")
+def _download_with_retries(engine, browser):
+    last_error = None
+    use_browser = engine == "selenium"
+    for attempt in range(1, 4):
+        try:
+            downloaded_file = None
+            if not use_browser:
+                try:
+                    downloaded_file = download_csv_direct()
+                except RequestRejected as e:
+                    if engine == "http":
+                        raise RuntimeError(f"來源網站拒絕直接下載請求（{e}）。")
+                    print(f"來源網站拒絕直接下載請求（{e}），改用瀏覽器下載...")
+                    use_browser = True
+
+            if downloaded_file is None:
+                print(f"{'初始化' if browser.driver is None else '重用'} WebDriver...（第 {attempt} 次嘗試）")
+                downloaded_file = _download_with_driver(browser.get(), lean=browser.lean)
 
+            if isinstance(downloaded_file, str):
+                print(f"已下載：{downloaded_file}")
+            with metrics.stage("merge_e3030"):
+                merge_download(downloaded_file)
             return True
 
         except Exception as e:
             last_error = e
             print(f"第 {attempt} 次嘗試失敗：{e}")
+            metrics.record("retry", "e3030", attempt=attempt, error=str(e))
+            browser.reset()
             time.sleep(2 * attempt)
         finally:
-            if driver:
-                driver.quit()
             if os.path.exists(DOWNLOAD_DIR):
                 shutil.rmtree(DOWNLOAD_DIR)
 
@@ -230,63 +623,52 @@ def download_csv():
     return False
 
 
-def process_and_plot():
-    """Process CSV and generate plot. Returns True on success."""
+def default_rate_frame(all_cities=False):
+    """Quarter x city default-rate table for the target cities, sorted by quarter.
+
+    ``all_cities`` keeps every county reported in the latest quarter instead.
+    """
     print("處理 CSV 資料...")
-    df = read_csv_auto(CSV_OUTPUT)
+    try:
+        df = read_dataset(DATASET, columns=[RATE_COLUMN])
+    except ValueError:
+        # Not the merged layout yet (e.g. a first, raw Big5 download).
+        df = read_csv_auto(CSV_OUTPUT)
 
     time_col = [c for c in df.columns if '期別' in c or '季' in c or 'Year' in c][0]
     region_col = [c for c in df.columns if '縣市' in c or 'City' in c or 'Region' in c][0]
     rate_col = [c for c in df.columns if '率' in c or 'Rate' in c][0]
 
-    target_cities = ['桃園市', '新竹市', '新竹縣', '苗栗縣', '台北市', '新北市', '台中市', '台南市', '高雄市']
-
-    normalized_cities = {
-        '臺北市': '台北市', '臺中市': '台中市', '臺南市': '台南市', '臺東縣': '台東縣'
-    }
-    df[region_col] = df[region_col].replace(normalized_cities)
-    df_filtered = df[df[region_col].isin(target_cities)].copy()
-
-    df_filtered.loc[:, rate_col] = df_filtered[rate_col].astype(str).str.replace('%', '', regex=False)
-    df_filtered.loc[:, rate_col] = pd.to_numeric(df_filtered[rate_col], errors='coerce')
-
-    pivot_df = df_filtered.pivot_table(index=time_col, columns=region_col, values=rate_col)
+    city_codes = cities.encode(df[region_col])
+    target_codes = TARGET_CODES
+    if all_cities:
+        period_codes = periods.encode(df[time_col])
+        latest = np.unique(city_codes[period_codes == period_codes.max()])
+        latest = latest[(latest != cities.TOTAL) & (latest != cities.UNKNOWN)]
+        target_codes = latest[np.argsort(cities.labels(latest, 'e3030'), kind='stable')]
+    target_cities = cities.labels(target_codes, 'e3030').tolist()
+    keep = np.isin(city_codes, target_codes)
+    df_filtered = df[keep].copy()
+    df_filtered[region_col] = cities.labels(city_codes[keep], 'e3030')
+
+    df_filtered[rate_col] = pd.to_numeric(
+        df_filtered[rate_col].astype(str).str.replace('%', '', regex=False), errors='coerce')
+
+    pivot_df = df_filtered.pivot_table(index=time_col, columns=region_col, values=rate_col, observed=True)
     existing_cities = [c for c in target_cities if c in pivot_df.columns]
     pivot_df = pivot_df[existing_cities]
 
-    def parse_quarter(q_str):
-        match = re.match(r'(\d+)Q(\d+)', str(q_str))
-        if match:
-            return int(match.group(1)), int(match.group(2))
-        return 0, 0
+    return pivot_df.iloc[periods.encode(pivot_df.index).argsort(kind="stable")]
 
-    def format_quarter_label(q_str):
-        match = re.match(r'(\d+)Q(\d+)', str(q_str))
-        if match:
-            minguo_year = int(match.group(1))
-            quarter = int(match.group(2))
-            return f"{minguo_year + 1911}Q{quarter}"
-        return q_str
 
-    sorted_index = sorted(pivot_df.index, key=parse_quarter)
-    pivot_df = pivot_df.reindex(sorted_index)
+def plot_default_rate(pivot_df, output_path, compact=False, raster=None):
+    plt = common.pyplot()   # only plotting runs pay for matplotlib
 
-    # Plotting
     cities = pivot_df.columns.tolist()
     fig, axes = plt.subplots(nrows=len(cities), ncols=1, sharex=True, figsize=(12, 3 * len(cities)))
 
-    cjk_fonts = ['Noto Sans CJK TC', 'Noto Sans CJK JP', 'Noto Sans CJK SC', 'Noto Sans CJK KR',
-                 'Microsoft JhengHei', 'Arial Unicode MS', 'WenQuanYi Micro Hei', 'TakaoPGothic', 'Ubuntu Mono', 'sans-serif']
-
-    found_cjk_font = False
-    for font_name in cjk_fonts:
-        if any(font_name in font.name for font in fm.fontManager.ttflist):
-            plt.rcParams['font.sans-serif'] = [font_name, 'sans-serif']
-            found_cjk_font = True
-            break
-
-    if not found_cjk_font:
-        plt.rcParams['font.sans-serif'] = ['sans-serif']
+    font_name = resolve_cjk_font()
+    plt.rcParams['font.sans-serif'] = [font_name, 'sans-serif'] if font_name else ['sans-serif']
 
     plt.rcParams['axes.unicode_minus'] = False
 
@@ -299,14 +681,14 @@ def process_and_plot():
 
         ax.plot(pivot_df.index, data, linestyle='-', color=colors[i], alpha=0.6, label=city)
 
-        normal_mask = data <= 0.3
+        normal_mask = data <= RISK_THRESHOLD
         ax.scatter(pivot_df.index[normal_mask], data[normal_mask], marker='o', color=colors[i], s=30)
 
-        risk_mask = data > 0.3
+        risk_mask = data > RISK_THRESHOLD
         if risk_mask.any():
             ax.scatter(pivot_df.index[risk_mask], data[risk_mask], marker='^', color=colors[i], s=60, edgecolor='red', linewidth=1, zorder=5)
 
-        ax.axhline(y=0.3, color='red', linestyle='--', linewidth=1.5, alpha=0.8, label='Risk Alarm (0.3%)')
+        ax.axhline(y=RISK_THRESHOLD, color='red', linestyle='--', linewidth=1.5, alpha=0.8, label='Risk Alarm (0.3%)')
 
         ax.set_title(city, loc='left', fontsize=16, fontweight='bold')
         ax.set_ylabel('Default Rate (%)')
@@ -324,120 +706,142 @@ def process_and_plot():
     if n > 20:
         step = max(1, n // 15)
         axes[-1].set_xticks(range(0, n, step))
-        axes[-1].set_xticklabels([format_quarter_label(q) for q in pivot_df.index[::step]], rotation=45, fontsize=12)
+        axes[-1].set_xticklabels(periods.to_gregorian(pivot_df.index[::step]), rotation=45, fontsize=12)
     else:
-        axes[-1].set_xticklabels([format_quarter_label(q) for q in pivot_df.index], rotation=45, fontsize=12)
+        axes[-1].set_xticklabels(periods.to_gregorian(pivot_df.index), rotation=45, fontsize=12)
 
-    fig.suptitle('Quarterly Housing Loan Default Rate - Major Cities\n(主要城市購置住宅貸款違約率)', fontsize=20)
+    fig.suptitle(CHART_TITLE, fontsize=20)
     plt.tight_layout(rect=[0, 0.03, 1, 0.97])
 
-    svg_path = os.path.join(SVG_DIR, "major_cities_default_rate.svg")
-    plt.savefig(svg_path, format='svg')
-    print(f"圖表已輸出：{svg_path}")
+    save_figure(fig, output_path, compact=compact, raster=raster)
+    plt.close(fig)
+    print(f"圖表已輸出：{output_path}")
+
+
+def figure_jobs(compact=False, raster=None, renderer="native", all_cities=False):
+    """The default-rate chart; ``compact`` and ``raster`` apply to the matplotlib renderer.
+
+    ``all_cities`` draws every county (not published; used by svg_charts.py).
+    """
+    pivot_df = default_rate_frame(all_cities=all_cities)
+    name = "default_rate_all_counties" if all_cities else "default_rate"
+    output = os.path.join(SVG_DIR, ("all_counties" if all_cities else "major_cities") + "_default_rate.svg")
+    if renderer == "matplotlib":
+        return [FigureJob(name, output, plot_default_rate, (pivot_df,),
+                          params={"compact": compact, "raster": raster})]
+    title = ("Quarterly Housing Loan Default Rate - All Counties\n(各縣市購置住宅貸款違約率)"
+             if all_cities else CHART_TITLE)
+    return [FigureJob(name, output, svg_charts.line_panels,
+                      (periods.to_gregorian(pivot_df.index), pivot_df.columns.tolist(),
+                       pivot_df.to_numpy(dtype=float).T),
+                      params={"title": title, "ylabel": "Default Rate (%)", "ylim": 2.0,
+                              "threshold": RISK_THRESHOLD,
+                              "threshold_label": f"Risk Alarm ({RISK_THRESHOLD}%)"})]
+
+
+def process_and_plot(force=False, compact=False, raster=None, renderer="native"):
+    """Process CSV and generate plot (skipped when its inputs are unchanged). Returns True on success."""
+    render_figures(figure_jobs(compact=compact, raster=raster, renderer=renderer), force=force)
     return True
 
 
+def report():
+    """Latest-quarter default rate per target city, flagging rates above RISK_THRESHOLD."""
+    pivot_df = default_rate_frame()
+    latest = pivot_df.index[-1]
+    change = pivot_df.diff().iloc[-1]
+    print(f"\n{TARGET_TEXT}：{latest}（{periods.to_gregorian([latest])[0]}），與上季比較")
+    for city, rate in pivot_df.iloc[-1].items():
+        flag = "  ▲ 高於風險門檻" if rate > RISK_THRESHOLD else ""
+        print(f"  {city}  {rate:5.2f}%  {change[city]:+.2f}{flag}")
+
+
+README_SECTIONS = [("### 資料視覺化- 本季購置住宅貸款違約率", "![主要城市購置住宅貸款違約率]")]
+
+
 def update_readme_timestamp():
-    import pytz
-    from datetime import datetime
-
-    taipei_tz = pytz.timezone('Asia/Taipei')
-    now = datetime.now(taipei_tz)
-    timestamp_str = now.strftime("Update time: %Y-%m-%d %H:%M:%S CST")
-
-    readme_path = "README.md"
-    if not os.path.exists(readme_path):
-        return
-
-    with open(readme_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    section_header = "### 資料視覺化- 本季購置住宅貸款違約率"
-    next_section_header = "### 資料視覺化- 全台建物買賣移轉棟數"
-    image_prefix = "![主要城市購置住宅貸款違約率]"
-    update_pattern = r"^Update time: \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} CST$"
-
-    lines = content.splitlines()
-    section_start = None
-    for i, line in enumerate(lines):
-        if line.strip() == section_header:
-            section_start = i
-            break
+    common.update_readme_timestamp(README_SECTIONS)
 
-    if section_start is None:
-        return
 
-    section_end = len(lines)
-    for i in range(section_start + 1, len(lines)):
-        if lines[i].strip() == next_section_header:
-            section_end = i
-            break
+def add_fetch_arguments(parser):
+    parser.add_argument("--engine", choices=("auto", "http", "selenium"), default="auto",
+                        help="下載方式：auto 先以 HTTP 直接下載、遭拒才改用瀏覽器（預設）")
+    parser.add_argument("--lean", action="store_true",
+                        help="瀏覽器精簡模式：eager 載入、封鎖圖片/樣式/字型/追蹤腳本，並於頁面內 fetch 取得 CSV")
 
-    section_lines = lines[section_start:section_end]
-    section_lines = [line for line in section_lines if not re.match(update_pattern, line.strip())]
 
-    image_index = None
-    for idx, line in enumerate(section_lines):
-        if line.strip().startswith(image_prefix):
-            image_index = idx
-            break
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="下載購置住宅貸款違約率並繪製主要城市趨勢圖")
+    add_fetch_arguments(parser)
+    parser.add_argument("--fetch-only", action="store_true",
+                        help="只下載並合併資料，不繪圖（不載入 matplotlib）")
+    parser.add_argument("--force-render", action="store_true",
+                        help="即使輸入資料未變更也重繪圖表")
+    add_render_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    check_render_arguments(parser, args)
+    return args
 
-    if image_index is not None:
-        section_lines.insert(image_index, "")
-        section_lines.insert(image_index, timestamp_str)
-    else:
-        insert_index = len(section_lines)
-        while insert_index > 0 and section_lines[insert_index - 1].strip() == "":
-            insert_index -= 1
-        section_lines.insert(insert_index, "")
-        section_lines.insert(insert_index, timestamp_str)
-
-    normalized_section_lines = []
-    previous_blank = False
-    for line in section_lines:
-        current_blank = line.strip() == ""
-        if current_blank and previous_blank:
-            continue
-        normalized_section_lines.append(line)
-        previous_blank = current_blank
 
-    merged_lines = lines[:section_start] + normalized_section_lines + lines[section_end:]
-    new_content = "\n".join(merged_lines).rstrip() + "\n"
+def fetch(args):
+    """Download step for the options of add_fetch_arguments(); True when new data was merged."""
+    return download_csv(engine=args.engine, lean=args.lean)
 
-    with open(readme_path, "w", encoding="utf-8") as f:
-        f.write(new_content)
-    print(f"README 已更新：{timestamp_str}")
 
+def fetch_stages(args):
+    """fetch() as a pipeline stage; download, parse and merge share one retry loop."""
+    from pipeline import Stage, keep_existing
+    return [Stage("fetch_e3030", lambda ctx: fetch(args), fallback=keep_existing(CSV_OUTPUT, "default-rate"),
+                  fresh=bool)]
 
-def main():
-    # Phase 1: Download
-    fresh_download = False
-    try:
-        fresh_download = download_csv()
-    except Exception as e:
-        if not os.path.exists(CSV_OUTPUT):
-            print(f"錯誤：無法下載且本地也沒有既有 CSV。{e}")
+
+DERIVED_OUTPUTS = []
+
+
+def derive():
+    """Outputs computed from the CSV: warehouse tables and the anomaly gate; never raises."""
+    warehouse.refresh([DATASET])
+    anomaly_scan.gate(DATASET)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with metrics.session("fetch_and_plot", profile=args.profile):
+        # Phase 1: Download
+        fresh_download = False
+        try:
+            with metrics.stage("fetch_e3030"):
+                fresh_download = fetch(args)
+        except Exception as e:
+            if not os.path.exists(CSV_OUTPUT):
+                print(f"錯誤：無法下載且本地也沒有既有 CSV。{e}")
+                sys.exit(2)
+            print(f"下載失敗，改用既有資料：{e}")
+
+        with metrics.stage("derive_default_rate"):
+            derive()
+
+        # Phase 2: Process and plot
+        try:
+            if not args.fetch_only:
+                with metrics.stage("render"):
+                    process_and_plot(force=args.force_render, **render_options(args))
+        except Exception as e:
+            print(f"處理 CSV 或繪圖時發生錯誤：{e}")
+            import traceback
+            traceback.print_exc()
             sys.exit(2)
-        print(f"下載失敗，改用既有資料：{e}")
 
-    # Phase 2: Process and plot
-    try:
-        process_and_plot()
-    except Exception as e:
-        print(f"處理 CSV 或繪圖時發生錯誤：{e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(2)
-
-    # Phase 3: Update README only if fresh data
-    if fresh_download:
-        update_readme_timestamp()
-    else:
-        print("使用既有資料，不更新 README 時間戳。")
+        # Phase 3: Update README only if fresh data
+        if fresh_download:
+            update_readme_timestamp()
+        else:
+            print("使用既有資料，不更新 README 時間戳。")
 
-    # Exit code: 0 = fresh data, 1 = used cache
-    if not fresh_download:
-        sys.exit(1)
+        # Exit code: 0 = fresh data, 1 = used cache
+        if not fresh_download:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+"""On-disk conditional-GET response cache for deterministic API URLs (statis.moi.gov.tw)."""
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_TTL = 6 * 3600                  # seconds a cached body is served without revalidation
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024    # total body size kept on disk before eviction
+
+
+class CacheMiss(RuntimeError):
+    """Raised in offline mode when a URL has never been cached."""
+
+
+def normalize_url(url, ignore_params=()):
+    """``url`` with a lower-case scheme and host, sorted query and the ``ignore_params`` left out."""
+    parts = urlsplit(url)
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ignore_params]
+    query = urlencode(sorted(params), safe=",")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+
+class HttpCache:
+    """Bodies are stored as ``<key>.body`` next to a ``<key>.json`` holding the URL,
+    ETag / Last-Modified validators, a SHA-256 content hash and fetch/access times.
+
+    Within ``ttl`` a cached body is returned without touching the network; after
+    that the request is revalidated with If-None-Match / If-Modified-Since. When
+    the server sends no validators the content hash still detects an unchanged
+    body, so the file is not rewritten. ``offline=True`` never hits the network.
+
+    Query parameters in ``ignore_params`` are not part of the key: a URL whose
+    end date moves with the calendar still maps to one entry, revalidated
+    rather than re-downloaded. Responses with status >= 400 raise
+    ``requests.HTTPError`` and are never cached.
+    """
+
+    def __init__(self, root, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, offline=False,
+                 ignore_params=()):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.ignore_params = frozenset(ignore_params)
+        self.stats = {"hit": 0, "revalidated": 0, "unchanged": 0, "downloaded": 0}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _key_url(self, url):
+        return normalize_url(url, self.ignore_params)
+
+    def _paths(self, url):
+        key = hashlib.sha256(self._key_url(url).encode("utf-8")).hexdigest()
+        base = os.path.join(self.root, key)
+        return base + ".json", base + ".body"
+
+    def _load_meta(self, meta_path, body_path):
+        if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path, meta):
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, meta_path)
+
+    def _read_body(self, meta_path, body_path, meta, counter):
+        with open(body_path, "rb") as f:
+            body = f.read()
+        meta["accessed_at"] = time.time()
+        with self._lock:
+            self._write_meta(meta_path, meta)
+            self.stats[counter] += 1
+        return body
+
+    def get(self, session, url, **kwargs):
+        """Return the response body for ``url``, using ``session.get`` only when needed."""
+        meta_path, body_path = self._paths(url)
+        meta = self._load_meta(meta_path, body_path)
+
+        if meta is not None and (self.offline or time.time() - meta["fetched_at"] < self.ttl):
+            return self._read_body(meta_path, body_path, meta, "hit")
+        if self.offline:
+            raise CacheMiss(f"離線模式下無快取資料：{url}")
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        r = session.get(url, headers=headers, **kwargs)
+        if r.status_code == 304 and meta is not None:
+            meta["fetched_at"] = time.time()
+            return self._read_body(meta_path, body_path, meta, "revalidated")
+        if r.status_code >= 400:
+            r.raise_for_status()
+        if r.status_code != 200:
+            return r.content
+
+        body = r.content
+        digest = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        new_meta = {
+            "url": self._key_url(url),
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "sha256": digest,
+            "size": len(body),
+            "fetched_at": now,
+            "accessed_at": now,
+        }
+        with self._lock:
+            if meta is not None and meta.get("sha256") == digest:
+                self.stats["unchanged"] += 1
+            else:
+                tmp = body_path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, body_path)
+                self.stats["downloaded"] += 1
+            self._write_meta(meta_path, new_meta)
+            self._evict()
+        return body
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.root, name)
+            body_path = meta_path[:-len(".json")] + ".body"
+            meta = self._load_meta(meta_path, body_path)
+            if meta is None:
+                continue
+            size = os.path.getsize(body_path)
+            total += size
+            entries.append((meta.get("accessed_at", 0), size, meta_path, body_path))
+
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (meta_path, body_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+
+    def summary(self):
+        labels = {"hit": "直接命中", "revalidated": "304 驗證", "unchanged": "內容未變",
+                  "downloaded": "重新下載"}
+        return "、".join(f"{labels[k]} {v}" for k, v in self.stats.items())
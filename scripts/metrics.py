@@ -0,0 +1,269 @@
+"""Run metrics as JSON lines: stage durations, HTTP calls, row counts, retries and peak RSS.
+
+The update scripts call stage(), http() and record() at the points worth
+timing (Chrome start-up, page wait, download poll, each statis request and
+its parsing, merges, derived outputs, each rendered figure). Records are
+kept in memory and written when the run ends:
+
+    .cache/metrics/last_run.jsonl   every record of the latest run, one JSON object per line
+    .cache/metrics/history.jsonl    one summary line per run: stage totals, HTTP totals, peak RSS
+
+With --profile the outermost stage on each thread also runs under cProfile
+and leaves a pstats dump in .cache/metrics/profile/<run>/<stage>.prof
+(open with snakeviz, or flameprof / gprof2dot for a flame graph). Only one
+profiler can be active at a time, so the pipeline runs its stages one after
+another under --profile; a stage that starts while another is being
+profiled is timed but not profiled.
+
+    python scripts/metrics.py             # latest run against the median of earlier runs
+    python scripts/metrics.py --gate      # exit 1 when a stage regressed
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+
+from common import CACHE_ROOT, PROJECT_ROOT
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:   # Windows
+    HAS_RESOURCE = False
+
+METRICS_DIR = os.path.join(CACHE_ROOT, "metrics")
+LAST_RUN_PATH = os.path.join(METRICS_DIR, "last_run.jsonl")
+HISTORY_PATH = os.path.join(METRICS_DIR, "history.jsonl")
+PROFILE_DIR = os.path.join(METRICS_DIR, "profile")
+
+HISTORY_RUNS = 10          # earlier runs the latest one is compared against
+REGRESSION_RATIO = 1.5     # slower than the median by this factor ...
+REGRESSION_SECONDS = 0.5   # ... and by at least this much counts as a regression
+
+_lock = threading.Lock()
+_profile_lock = threading.Lock()
+_local = threading.local()
+_records = []
+_run = {"id": None, "command": None, "started": None, "origin": time.perf_counter(), "profile": False}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process or its largest child (render workers), in MB."""
+    if not HAS_RESOURCE:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def record(kind, name, **fields):
+    """Add one record; ``t`` is seconds since the run started."""
+    rec = {"kind": kind, "name": name, "t": round(time.perf_counter() - _run["origin"], 4), **fields}
+    with _lock:
+        _records.append(rec)
+    return rec
+
+
+def drain(kind=None):
+    """Remove the records collected so far and return those of ``kind`` (all when None)."""
+    with _lock:
+        taken = list(_records)
+        _records.clear()
+    return [r for r in taken if kind is None or r["kind"] == kind]
+
+
+def http(name, url, status, seconds, nbytes, **fields):
+    """One HTTP request: status (None when served from the response cache), latency, body size."""
+    return record("http", name, url=url, status=status, seconds=round(seconds, 4), bytes=nbytes, **fields)
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time the block as stage ``name``; the yielded dict takes extra fields such as rows or status."""
+    depth = getattr(_local, "depth", 0)
+    profiler = None
+    if _run["profile"] and depth == 0 and _profile_lock.acquire(blocking=False):
+        import cProfile
+        profiler = cProfile.Profile()
+    _local.depth = depth + 1
+    fields.setdefault("status", "ok")
+    t0 = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield fields
+    except BaseException:
+        fields["status"] = "failed"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            try:
+                fields["profile"] = _dump(profiler, name)
+            finally:
+                _profile_lock.release()
+        _local.depth = depth
+        record("stage", name, seconds=round(time.perf_counter() - t0, 4), peak_rss_mb=peak_rss_mb(), **fields)
+
+
+def _dump(profiler, name):
+    directory = os.path.join(PROFILE_DIR, _run["id"] or "adhoc")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, re.sub(r"[^\w.-]", "_", name) + ".prof")
+    profiler.dump_stats(path)
+    return os.path.relpath(path, PROJECT_ROOT).replace(os.sep, "/")
+
+
+def pad(text, width):
+    """Left-justify ``text`` to ``width`` terminal columns (CJK characters take two)."""
+    return text + " " * (width - sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text))
+
+
+def profiling():
+    return _run["profile"]
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="以 cProfile 剖析每個階段，輸出至 .cache/metrics/profile/")
+
+
+# ── runs ───────────────────────────────────────────────────────────────────
+
+def start(command, profile=False):
+    with _lock:
+        _records.clear()
+    _run.update(id=datetime.now().strftime("%Y%m%dT%H%M%S"), command=command,
+                started=datetime.now().isoformat(timespec="seconds"),
+                origin=time.perf_counter(), profile=profile)
+
+
+def summarize(records):
+    """Per-run totals: seconds per stage name, HTTP requests / errors / bytes / seconds, retries, rows."""
+    stages, rows = {}, {}
+    calls = [r for r in records if r["kind"] == "http"]
+    for r in records:
+        if r["kind"] == "stage":
+            stages[r["name"]] = round(stages.get(r["name"], 0.0) + r["seconds"], 4)
+        elif r["kind"] == "rows":
+            rows[r["name"]] = {k: v for k, v in r.items() if k not in ("kind", "name", "t")}
+    return {
+        "stages": stages,
+        "http": {
+            "requests": len(calls),
+            "errors": sum(1 for r in calls if r["status"] is not None and r["status"] >= 400),
+            "bytes": sum(r["bytes"] for r in calls),
+            "seconds": round(sum(r["seconds"] for r in calls), 4),
+        },
+        "retries": sum(1 for r in records if r["kind"] == "retry"),
+        "rows": rows,
+    }
+
+
+def finish(exit_code):
+    """Write the run's records and append its summary to the history; returns the summary."""
+    if _run["id"] is None:
+        return None
+    with _lock:
+        records = list(_records)
+    summary = {
+        "run": _run["id"],
+        "command": _run["command"],
+        "started": _run["started"],
+        "exit": exit_code,
+        "seconds": round(time.perf_counter() - _run["origin"], 4),
+        "peak_rss_mb": peak_rss_mb(),
+        **summarize(records),
+    }
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(LAST_RUN_PATH, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    with open(HISTORY_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+    _run["id"] = None
+    return summary
+
+
+@contextmanager
+def session(command, profile=False):
+    """start() ... finish() around a script's main; set ``run["exit"]`` or raise SystemExit."""
+    start(command, profile=profile)
+    run = {"exit": 0}
+    try:
+        yield run
+    except SystemExit as e:
+        run["exit"] = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    except BaseException:
+        run["exit"] = "error"
+        raise
+    finally:
+        directory = os.path.join(PROFILE_DIR, _run["id"])
+        finish(run["exit"])
+        if profile and os.path.isdir(directory):
+            print(f"剖析檔已輸出：{directory}")
+
+
+# ── history ────────────────────────────────────────────────────────────────
+
+def load_history(path=HISTORY_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+
+def compare(latest, earlier):
+    """Rows (item, latest, median of ``earlier``, ratio, regressed) for every timed item of ``latest``."""
+    items = [("總耗時", latest["seconds"], [r["seconds"] for r in earlier])]
+    items += [(name, secs, [r["stages"][name] for r in earlier if name in r.get("stages", {})])
+              for name, secs in latest["stages"].items()]
+    items.append(("HTTP 請求", latest["http"]["seconds"], [r["http"]["seconds"] for r in earlier]))
+    rows = []
+    for name, value, past in items:
+        median = statistics.median(past) if past else None
+        ratio = value / median if median else None
+        regressed = (median is not None and value - median >= REGRESSION_SECONDS
+                     and value >= median * REGRESSION_RATIO)
+        rows.append((name, value, median, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比較最近一次執行與先前同指令執行的各階段耗時")
+    parser.add_argument("--runs", type=int, default=HISTORY_RUNS, help=f"比較的先前執行次數（預設 {HISTORY_RUNS}）")
+    parser.add_argument("--gate", action="store_true", help="有階段明顯變慢時結束代碼為 1")
+    args = parser.parse_args(argv)
+
+    history = load_history()
+    if not history:
+        print(f"尚無執行紀錄（{HISTORY_PATH}）")
+        return 0
+    latest = history[-1]
+    earlier = [r for r in history[:-1] if r["command"] == latest["command"]][-args.runs:]
+    print(f"最近一次：{latest['command']}（{latest['started']}，結束代碼 {latest['exit']}，"
+          f"峰值記憶體 {latest['peak_rss_mb']} MB）")
+    print(f"HTTP：{latest['http']['requests']} 個請求、{latest['http']['errors']} 個錯誤、"
+          f"{latest['http']['bytes']:,} bytes；重試 {latest['retries']} 次")
+    print(f"與先前 {len(earlier)} 次同指令執行的中位數比較：")
+    regressions = 0
+    for name, value, median, ratio, regressed in compare(latest, earlier):
+        past = f"{median:8.2f}s" if median is not None else f"{'—':>9}"
+        change = f"{(ratio - 1) * 100:+6.0f}%" if ratio is not None else ""
+        print(f"  {pad(name, 24)}{value:8.2f}s{past}  {change}{'  ▲ 變慢' if regressed else ''}")
+        regressions += regressed
+    return 1 if args.gate and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
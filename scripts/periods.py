@@ -0,0 +1,88 @@
+"""Integer quarter codes shared by every script: roc_year * 4 + quarter - 1.
+
+'098Q1' is 392 and '114Q4' is 459. Codes sort, compare and subtract as
+quarters (code - 4 is the same quarter a year earlier), so ordering, range
+filters and alignment are integer operations. Labels are parsed once per
+distinct value; unparsable labels become INVALID, which sorts first.
+
+The Parquet copies store the code (see columnar_store); read_dataset(...,
+labels=False) hands it back without formatting labels.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+INVALID = -1
+ROC_OFFSET = 1911
+# Quarterly pandas Period ordinals count from 1970Q1.
+_PERIOD_ORDINAL_OFFSET = (1970 - ROC_OFFSET) * 4
+
+_LABEL_RE = re.compile(r"^(\d+)Q([1-4])$")
+
+
+def code(roc_year, quarter):
+    return roc_year * 4 + quarter - 1
+
+
+def parse(label):
+    """'098Q1' -> 392; anything else -> INVALID."""
+    m = _LABEL_RE.match(str(label))
+    return code(int(m.group(1)), int(m.group(2))) if m else INVALID
+
+
+def encode(labels):
+    """'NNNQn' labels -> int16 codes, parsing each distinct label once."""
+    if isinstance(labels, pd.Series) and isinstance(labels.dtype, pd.CategoricalDtype):
+        uniques = labels.cat.categories
+        inverse = labels.cat.codes.to_numpy()
+    else:
+        inverse, uniques = pd.factorize(np.asarray(labels, dtype=object), use_na_sentinel=True)
+    table = np.array([parse(u) for u in uniques] + [INVALID], dtype=np.int16)
+    return table[inverse]   # a -1 (missing) position picks the trailing INVALID
+
+
+def split(codes):
+    """Codes -> (roc_year, quarter) integer arrays."""
+    codes = np.asarray(codes)
+    return codes // 4, codes % 4 + 1
+
+
+def _format(codes, fmt, year_offset):
+    codes = np.asarray(codes)
+    uniq, inverse = np.unique(codes, return_inverse=True)
+    labels = np.array([fmt.format(c // 4 + year_offset, c % 4 + 1) for c in uniq.tolist()], dtype=object)
+    return labels[inverse.reshape(codes.shape)]
+
+
+def roc_label(codes):
+    """Codes -> 'NNNQn' labels (ROC year)."""
+    return _format(codes, "{:03d}Q{}", 0)
+
+
+def gregorian_label(codes):
+    """Codes -> 'YYYYQn' labels (AD year)."""
+    return _format(codes, "{}Q{}", ROC_OFFSET)
+
+
+def to_gregorian(labels):
+    """'098Q1' labels -> '2009Q1' labels."""
+    return gregorian_label(encode(labels)).tolist()
+
+
+def to_period_index(codes):
+    """Codes -> quarterly pandas PeriodIndex (AD years)."""
+    ordinals = np.asarray(codes, dtype=np.int64) - _PERIOD_ORDINAL_OFFSET
+    return pd.PeriodIndex(pd.arrays.PeriodArray(ordinals, dtype=pd.PeriodDtype("Q")))
+
+
+def from_period_index(index):
+    """Quarterly PeriodIndex (or anything convertible) -> codes."""
+    index = pd.PeriodIndex(index).asfreq("Q")
+    return (index.asi8 + _PERIOD_ORDINAL_OFFSET).astype(np.int16)
+
+
+def to_ym(period):
+    """Code -> 'YYYMM', the first month of the quarter, as the statis API expects."""
+    roc_year, quarter = divmod(int(period), 4)
+    return f"{roc_year:03d}{quarter * 3 + 1:02d}"
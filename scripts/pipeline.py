@@ -0,0 +1,381 @@
+"""In-process update pipeline: fetch, merge, derive, render and README stages as one DAG.
+
+Each Stage names the stages it depends on. The runner starts a stage as
+soon as those have finished, so the E3030 and statis branches run
+concurrently in threads. A dataset's stages (download, derive, render)
+depend only on each other, so a failed download blocks that dataset alone;
+an ``always`` stage runs once its dependencies have finished, whatever
+their status. A ``hashed`` stage is skipped when its key (input
+files, dependency results, parameters and the source of its ``code``
+modules) matches its last successful run, the files it wrote are
+unchanged since and its ``current`` check, if any, holds. Keys, output
+hashes and the last run's timings are kept in .cache/pipeline.json.
+
+README timestamps for every fresh dataset whose stages all succeeded are
+written in one edit at the end. After a run the wall time of each stage and the critical path (the
+chain of stages that finished last) are printed, and appended to the
+GitHub Actions step summary when running there.
+
+    python scripts/taiwanhouse.py all          # build and run the pipeline
+    python scripts/pipeline.py                 # stage timings and critical path of the last run
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+
+import common
+import metrics
+from common import CACHE_ROOT, PROJECT_ROOT
+
+MANIFEST_PATH = os.path.join(CACHE_ROOT, "pipeline.json")
+
+STATUS_LABELS = {
+    "ok": "完成",
+    "skipped": "略過",
+    "fallback": "沿用既有",
+    "failed": "失敗",
+    "blocked": "未執行",
+}
+
+
+class Stage:
+    """``run(ctx)`` does the work; ``ctx.results`` holds the results of the stages it depends on.
+
+    ``inputs`` are files whose content is part of the key, ``outputs`` the
+    files it writes. ``fallback(exc)``, if given, handles an exception from
+    ``run``: its return value becomes the result (status 'fallback'), and
+    re-raising fails the stage. ``fresh(result)`` tells whether a successful
+    run brought new data (default True); the README stage uses it. An
+    ``always`` stage is not blocked by failed dependencies. ``current()``
+    checks state a hashed stage keeps outside its ``outputs``: while it is
+    False the stage runs even when its key matches.
+    """
+
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), hashed=False,
+                 params=None, code=(), fallback=None, fresh=None, always=False, current=None):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.hashed = hashed
+        self.params = params or {}
+        self.code = list(code)
+        self.fallback = fallback
+        self.fresh = fresh or (lambda result: True)
+        self.always = always
+        self.current = current or (lambda: True)
+        self.dataset = None     # set by build() on every stage of a dataset
+        self.download = False   # set by build() on each dataset's download stage
+
+
+class Context:
+    """Results, statuses and (start, end) offsets in seconds of the stages run so far."""
+
+    def __init__(self):
+        self.results = {}
+        self.status = {}
+        self.timings = {}
+        self.lock = threading.Lock()
+
+
+def keep_existing(csv_path, dataset):
+    """Fallback for a download stage: carry on with the existing CSV, or re-raise without one."""
+    def fallback(exc):
+        if not os.path.exists(csv_path):
+            print(f"錯誤：{dataset} 無法下載且無既有資料：{exc}")
+            raise exc
+        print(f"{dataset} 下載失敗，改用既有資料：{exc}")
+        return None
+    return fallback
+
+
+# ── keys ───────────────────────────────────────────────────────────────────
+
+def _relpath(path):
+    return os.path.relpath(path, PROJECT_ROOT).replace(os.sep, "/")
+
+
+def _feed(h, obj):
+    """Feed a canonical byte form of a stage result into hash ``h``."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(b"pd")
+        h.update(repr(list(obj.columns) if isinstance(obj, pd.DataFrame) else [obj.name]).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(obj, index=False).to_numpy().tobytes())
+    elif isinstance(obj, dict):
+        h.update(f"dict{len(obj)}".encode("ascii"))
+        for k in sorted(obj, key=str):
+            _feed(h, k)
+            _feed(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"seq{len(obj)}".encode("ascii"))
+        for item in obj:
+            _feed(h, item)
+    else:
+        h.update(json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+
+
+def stage_key(stage, ctx):
+    h = hashlib.sha256()
+    _feed(h, [stage.name, stage.params])
+    for path in stage.inputs:
+        h.update(f"{_relpath(path)}={common.file_sha256(path)}".encode("utf-8"))
+    for dep in stage.deps:
+        _feed(h, ctx.results.get(dep))
+    for module in stage.code:
+        h.update(inspect.getsource(module).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _unchanged(record, key):
+    if not record or record.get("key") != key:
+        return False
+    return all(common.file_sha256(os.path.join(PROJECT_ROOT, path)) == sha
+               for path, sha in record.get("outputs", {}).items())
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+# ── runner ─────────────────────────────────────────────────────────────────
+
+def _execute(stage, ctx, records, force, origin):
+    with metrics.stage(stage.name) as fields:
+        _run_stage(stage, ctx, records, force, origin)
+        fields["status"] = ctx.status[stage.name]
+
+
+def _run_stage(stage, ctx, records, force, origin):
+    start = time.perf_counter()
+    result, status = None, None
+    try:
+        key = stage_key(stage, ctx) if stage.hashed else None
+        if key is not None and not force and _unchanged(records.get(stage.name), key) and stage.current():
+            status = "skipped"
+            print(f"輸入未變更，略過階段：{stage.name}")
+        else:
+            try:
+                result, status = stage.run(ctx), "ok"
+            except Exception as e:
+                if stage.fallback is None:
+                    raise
+                result, status = stage.fallback(e), "fallback"
+            if key is not None and status == "ok":
+                records[stage.name] = {
+                    "key": key,
+                    "outputs": {_relpath(p): common.file_sha256(p) for p in stage.outputs},
+                }
+    except Exception as e:
+        print(f"階段 {stage.name} 失敗：{e}")
+        result, status = None, "failed"
+    end = time.perf_counter()
+    with ctx.lock:
+        ctx.results[stage.name] = result
+        ctx.timings[stage.name] = (start - origin, end - origin)
+        ctx.status[stage.name] = status
+
+
+def run(stages, workers=None, force=False, manifest_path=MANIFEST_PATH):
+    """Run ``stages`` as a DAG; returns the Context. ``force`` ignores the recorded keys.
+
+    Under ``--profile`` the stages run one at a time, each with its own profile.
+    """
+    if metrics.profiling():
+        workers = 1
+    names = {s.name for s in stages}
+    for stage in stages:
+        unknown = [d for d in stage.deps if d not in names]
+        if unknown:
+            raise ValueError(f"階段 {stage.name} 依賴未定義的階段：{', '.join(unknown)}")
+
+    manifest = load_manifest(manifest_path)
+    records = manifest.setdefault("stages", {})
+    ctx = Context()
+    origin = time.perf_counter()
+    waiting = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers or len(stages) or 1) as pool:
+        while waiting or running:
+            for stage in list(waiting):
+                states = [ctx.status.get(d) for d in stage.deps]
+                if not stage.always and any(s in ("failed", "blocked") for s in states):
+                    waiting.remove(stage)
+                    ctx.status[stage.name] = "blocked"
+                    print(f"前置階段失敗，未執行：{stage.name}")
+                elif all(s is not None for s in states):
+                    waiting.remove(stage)
+                    running[pool.submit(_execute, stage, ctx, records, force, origin)] = stage
+            if not running:
+                if waiting:
+                    raise ValueError(f"階段依賴形成循環：{', '.join(s.name for s in waiting)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+
+    manifest["last_run"] = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "stages": [{"name": s.name, "deps": s.deps, "status": ctx.status[s.name],
+                    "start": round(ctx.timings[s.name][0], 4) if s.name in ctx.timings else None,
+                    "end": round(ctx.timings[s.name][1], 4) if s.name in ctx.timings else None}
+                   for s in stages],
+    }
+    save_manifest(manifest, manifest_path)
+    print_summary(manifest["last_run"]["stages"])
+    return ctx
+
+
+def critical_path(rows):
+    """Stages from the first to the last to finish, following at each step the dependency that ended last."""
+    ran = {r["name"]: r for r in rows if r["end"] is not None}
+    if not ran:
+        return []
+    name = max(ran, key=lambda n: ran[n]["end"])
+    path = [name]
+    while True:
+        deps = [d for d in ran[name]["deps"] if d in ran]
+        if not deps:
+            break
+        name = max(deps, key=lambda d: ran[d]["end"])
+        path.append(name)
+    return path[::-1]
+
+
+def print_summary(rows):
+    ran = [r for r in rows if r["end"] is not None]
+    total = max((r["end"] for r in ran), default=0.0)
+    path = critical_path(rows)
+    print(f"\n流程各階段（總耗時 {total:.2f}s）：")
+    print(f"  {metrics.pad('階段', 22)}{metrics.pad('狀態', 10)}{'':5}開始{'':5}耗時")
+    for r in rows:
+        if r["end"] is None:
+            print(f"  {metrics.pad(r['name'], 22)}{STATUS_LABELS[r['status']]}")
+            continue
+        mark = " *" if r["name"] in path else ""
+        print(f"  {metrics.pad(r['name'], 22)}{metrics.pad(STATUS_LABELS[r['status']], 10)}{r['start']:>8.2f}s"
+              f"{r['end'] - r['start']:>8.2f}s{mark}")
+    if path:
+        print(f"關鍵路徑（*）：{' → '.join(path)}")
+
+    summary = os.environ.get("GITHUB_STEP_SUMMARY")
+    if summary:
+        lines = ["", "### Pipeline stages", "", "| stage | status | start (s) | wall (s) |",
+                 "|---|---|---:|---:|"]
+        for r in rows:
+            timing = (f"{r['start']:.2f} | {r['end'] - r['start']:.2f}" if r["end"] is not None
+                      else " | ")
+            name = f"**{r['name']}**" if r["name"] in path else r["name"]
+            lines.append(f"| {name} | {r['status']} | {timing} |")
+        lines += ["", f"Critical path: {' → '.join(path)} ({total:.2f} s)", ""]
+        with open(summary, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+
+# ── stages of the update ───────────────────────────────────────────────────
+
+def fresh_datasets(stages, ctx):
+    """Datasets whose download stage succeeded with new data."""
+    return [s.dataset for s in stages if s.download
+            and ctx.status.get(s.name) == "ok" and s.fresh(ctx.results[s.name])]
+
+
+def failed_datasets(stages, ctx):
+    """Datasets with a failed or blocked stage."""
+    return list(dict.fromkeys(s.dataset for s in stages if s.dataset is not None
+                              and ctx.status.get(s.name) in ("failed", "blocked")))
+
+
+_warehouse_lock = threading.Lock()
+
+
+def _derive(module):
+    # Derive stages take turns: they all write the one SQLite warehouse.
+    with _warehouse_lock:
+        module.derive()
+
+
+def build(modules, args, command="all"):
+    """Stages for ``command`` ('fetch', 'plot' or 'all') over ``modules`` ({dataset: module}).
+
+    Each module supplies fetch_stages(args) (its download stage first),
+    derive(), DERIVED_OUTPUTS, CSV_OUTPUT, figure_jobs() and README_SECTIONS.
+    Every dataset gets its own chain of stages; the README stage waits for
+    all of them and records only the datasets that came through fresh.
+    """
+    import anomaly_scan
+    import transfer_monitor
+    import warehouse
+    from render_cache import render_figures, render_options
+
+    def render(module):
+        def run(ctx):
+            jobs = module.figure_jobs(**render_options(args))
+            return render_figures(jobs, workers=args.render_workers, force=args.force_render)
+        return run
+
+    stages = []
+    for dataset, module in modules.items():
+        suffix = dataset.replace("-", "_")
+        chain = []
+        if command in ("fetch", "all"):
+            fetch = module.fetch_stages(args)
+            fetch[0].download = True
+            chain += fetch + [Stage("derive_" + suffix, lambda ctx, m=module: _derive(m), deps=[fetch[-1].name],
+                                    inputs=[module.CSV_OUTPUT], outputs=module.DERIVED_OUTPUTS,
+                                    hashed=True, code=[module, warehouse, anomaly_scan, transfer_monitor],
+                                    current=warehouse.is_current)]
+        if command in ("plot", "all"):
+            chain.append(Stage("render_" + suffix, render(module), deps=[chain[-1].name] if chain else []))
+        for stage in chain:
+            stage.dataset = dataset
+        stages += chain
+
+    if command == "all":
+        def readme(ctx):
+            failed = failed_datasets(stages, ctx)
+            fresh = [d for d in fresh_datasets(stages, ctx) if d not in failed]
+            sections = [s for d in fresh for s in modules[d].README_SECTIONS]
+            if sections:
+                common.update_readme_timestamp(sections)
+            return fresh
+
+        stages.append(Stage("readme", readme, deps=[s.name for s in stages], always=True))
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="列出上次流程各階段的耗時與關鍵路徑")
+    parser.parse_args(argv)
+    rows = load_manifest().get("last_run", {}).get("stages")
+    if not rows:
+        print(f"尚無執行紀錄（{MANIFEST_PATH}），請先執行 python scripts/taiwanhouse.py all")
+        return 1
+    print_summary(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
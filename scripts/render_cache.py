@@ -0,0 +1,225 @@
+"""Content-addressed render cache: re-draw a figure only when its inputs change.
+
+Each figure is a FigureJob: a module-level render function, the data it is
+drawn from and its output path. The job key hashes that data, the plotting
+parameters, the source of the module defining the renderer, the matplotlib
+version and the installed font families (the native renderer supplies
+its own fingerprint instead). Keys of the last successful renders are kept
+in data/svg/render_manifest.json, which is committed with the SVGs (the
+monthly workflow commits data/), so CI runs starting from a clean checkout
+skip unchanged figures. Pending figures render concurrently in a process
+pool.
+
+    python scripts/render_cache.py              # all figures, skip unchanged
+    python scripts/render_cache.py --force      # re-draw everything
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from common import PROJECT_ROOT, file_sha256
+
+MANIFEST_PATH = os.path.join(PROJECT_ROOT, "data", "svg", "render_manifest.json")
+
+# The pipeline renders each dataset in its own thread; they share the manifest.
+_manifest_lock = threading.Lock()
+
+
+class FigureJob:
+    """``render(*args, **params, output_path=output)`` draws figure ``name``."""
+
+    def __init__(self, name, output, render, args=(), params=None):
+        self.name = name
+        self.output = output
+        self.render = render
+        self.args = tuple(args)
+        self.params = params or {}
+
+    def key(self):
+        h = hashlib.sha256()
+        _update(h, [self.name, os.path.relpath(self.output, PROJECT_ROOT), self.params])
+        _update(h, list(self.args))
+        module = sys.modules[self.render.__module__]
+        h.update(self.render.__qualname__.encode("utf-8"))
+        h.update(inspect.getsource(module).encode("utf-8"))
+        # Renderer modules that do not go through matplotlib supply their own fingerprint.
+        environment = getattr(module, "render_environment", _render_environment)
+        h.update(environment().encode("utf-8"))
+        return h.hexdigest()
+
+
+def _render_environment():
+    """matplotlib version plus the installed font families (CJK fallback changes output)."""
+    import matplotlib
+    import matplotlib.font_manager as fm
+    families = sorted({font.name for font in fm.fontManager.ttflist})
+    return matplotlib.__version__ + "|" + "|".join(families)
+
+
+def _update(h, obj):
+    """Feed a canonical byte form of ``obj`` into hash ``h``."""
+    if isinstance(obj, pd.DataFrame):
+        h.update(b"df")
+        h.update(obj.to_csv().encode("utf-8"))
+    elif isinstance(obj, pd.Series):
+        h.update(b"series")
+        h.update(obj.to_csv().encode("utf-8"))
+    elif isinstance(obj, np.ndarray):
+        h.update(f"nd{obj.dtype.str}{obj.shape}".encode("ascii"))
+        h.update(np.ascontiguousarray(obj).tobytes() if obj.dtype != object
+                 else json.dumps(obj.tolist(), ensure_ascii=False, default=str).encode("utf-8"))
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"seq{len(obj)}".encode("ascii"))
+        for item in obj:
+            _update(h, item)
+    else:
+        h.update(json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def _is_fresh(job, key, manifest):
+    entry = manifest.get(job.name)
+    if not entry or entry.get("key") != key or not os.path.exists(job.output):
+        return False
+    # A hand-edited or regenerated file no longer matches what was rendered.
+    return entry.get("output_sha256") == file_sha256(job.output)
+
+
+def _run(render, args, params, output):
+    t0 = time.perf_counter()
+    render(*args, **params, output_path=output)
+    return time.perf_counter() - t0
+
+
+def render_figures(jobs, workers=None, force=False):
+    """Render the jobs whose key changed; returns {name: seconds, or None if skipped}.
+
+    The manifest is updated for every figure that rendered (re-read at save
+    time, so concurrent calls keep each other's entries); the first render
+    error is re-raised after the other figures have finished.
+    """
+    manifest = load_manifest()
+    keys = {job.name: job.key() for job in jobs}
+    pending = [job for job in jobs if force or not _is_fresh(job, keys[job.name], manifest)]
+    results = {job.name: None for job in jobs}
+    for job in jobs:
+        if job not in pending:
+            print(f"圖表未變更，略過：{job.output}")
+            metrics.record("render", job.name, status="skipped")
+    if not pending:
+        return results
+
+    workers = min(len(pending), workers or os.cpu_count() or 1)
+    t0 = time.perf_counter()
+    errors, entries = [], {}
+    if workers == 1:
+        outcomes = []
+        for job in pending:
+            try:
+                outcomes.append(_run(job.render, job.args, job.params, job.output))
+            except Exception as e:
+                outcomes.append(e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run, job.render, job.args, job.params, job.output) for job in pending]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+
+    for job, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            errors.append(outcome)
+            print(f"繪製失敗：{job.name}：{outcome}")
+            metrics.record("render", job.name, status="failed")
+            continue
+        results[job.name] = outcome
+        metrics.record("render", job.name, status="ok", seconds=round(outcome, 4))
+        entries[job.name] = {
+            "key": keys[job.name],
+            "output": os.path.relpath(job.output, PROJECT_ROOT).replace(os.sep, "/"),
+            "output_sha256": file_sha256(job.output),
+        }
+    with _manifest_lock:
+        manifest = load_manifest()
+        manifest.update(entries)
+        save_manifest(manifest)
+
+    rendered = sum(1 for v in results.values() if v is not None)
+    print(f"圖表繪製：{rendered} 張重繪、{len(jobs) - len(pending)} 張略過，"
+          f"{workers} 個行程共 {time.perf_counter() - t0:.1f} s")
+    if errors:
+        raise errors[0]
+    return results
+
+
+def add_render_arguments(parser):
+    """--renderer / --compact-svg / --raster, shared by every command that draws figures."""
+    parser.add_argument("--renderer", choices=("native", "matplotlib"), default="native",
+                        help="繪圖方式：native 直接輸出 SVG（預設，見 svg_charts.py），matplotlib 為原繪圖流程")
+    parser.add_argument("--compact-svg", action="store_true",
+                        help="matplotlib 輸出精簡 SVG：文字保留為 <text>、座標取至小數一位、合併重複標記定義")
+    parser.add_argument("--raster", choices=("png", "webp"), default=None,
+                        help="另存同名的 PNG 或 WebP 點陣圖（需搭配 --renderer matplotlib）")
+
+
+def check_render_arguments(parser, args):
+    if args.raster and args.renderer != "matplotlib":
+        parser.error("--raster 需搭配 --renderer matplotlib")
+
+
+def render_options(args):
+    """figure_jobs() keyword arguments from the options added by add_render_arguments()."""
+    return {"compact": args.compact_svg, "raster": args.raster, "renderer": args.renderer}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="重繪輸入已變更的圖表（依內容雜湊略過未變更者）")
+    parser.add_argument("--force", action="store_true", help="忽略快取，全部重繪")
+    parser.add_argument("--workers", type=int, default=None, help="並行繪圖的行程數（預設為 CPU 核心數）")
+    add_render_arguments(parser)
+    args = parser.parse_args(argv)
+    check_render_arguments(parser, args)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fetch_and_plot
+    import fetch_transaction_trend
+
+    options = render_options(args)
+    jobs = fetch_and_plot.figure_jobs(**options) + fetch_transaction_trend.figure_jobs(**options)
+    try:
+        render_figures(jobs, workers=args.workers, force=args.force)
+    except Exception:
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""Native SVG small multiples: per-city line panels and stacked-area panels.
+
+Both published chart types are a column of panels sharing one x axis. This
+module writes them straight from NumPy arrays (text as ``<text>`` with a CJK
+font stack, coordinates to 0.1 pt, one path per marker set), in a few
+milliseconds and without importing matplotlib. The matplotlib renderers stay
+available through ``--renderer matplotlib``.
+
+    python scripts/svg_charts.py                 # render time / size report, incl. all counties
+    python scripts/svg_charts.py --matplotlib    # also time the matplotlib backend
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from svg_compact import FONT_STACK
+
+WIDTH = 864              # 12 in at 72 pt/in, like the matplotlib figures
+PANEL_HEIGHT = 200
+HEADER_HEIGHT = 80
+FOOTER_HEIGHT = 84
+MARGIN_LEFT = 72
+MARGIN_RIGHT = 16
+PANEL_TITLE = 26         # room above each plot area for the panel name
+PANEL_GAP = 14
+
+# matplotlib's tab20, which the default-rate chart cycles through.
+TAB20 = ["#1f77b4", "#aec7e8", "#ff7f0e", "#ffbb78", "#2ca02c", "#98df8a", "#d62728",
+         "#ff9896", "#9467bd", "#c5b0d5", "#8c564b", "#c49c94", "#e377c2", "#f7b6d2",
+         "#7f7f7f", "#c7c7c7", "#bcbd22", "#dbdb8d", "#17becf", "#9edae5"]
+RISK_COLOR = "#ff0000"
+
+STYLE = (
+    "text{{font-family:{fonts};fill:#262626;font-size:10px}}"
+    ".t{{font-size:16px;font-weight:bold}}.h{{font-size:20px;text-anchor:middle}}"
+    ".r{{text-anchor:end}}.m{{text-anchor:middle}}.x{{font-size:12px;text-anchor:end}}"
+    ".g{{fill:none;stroke:#b0b0b0;stroke-width:.8;stroke-dasharray:3 1.3;stroke-opacity:.7}}"
+    ".a{{fill:none;stroke:#000;stroke-width:.8}}"
+    ".k{{fill:#fff;fill-opacity:.8;stroke:#ccc;stroke-width:.8}}"
+)
+
+
+def render_environment():
+    """Render-cache fingerprint: output depends on nothing installed, only on the font stack."""
+    return "svg_charts|" + "|".join(FONT_STACK)
+
+
+def _num(v):
+    text = f"{v:.1f}"
+    if text.endswith(".0"):
+        text = text[:-2]
+    return "0" if text == "-0" else text
+
+
+def _text_width(text, size):
+    """Rough advance width: CJK glyphs are a full em, Latin about half."""
+    return sum(size if ord(ch) >= 0x2E80 else 0.56 * size for ch in text)
+
+
+def nice_ticks(vmax, target=5):
+    """0-based ticks on a 1/2/2.5/5 x 10^k step whose last tick covers ``vmax``."""
+    if not vmax > 0 or not math.isfinite(vmax):
+        return np.array([0.0, 1.0])
+    mag = 10 ** math.floor(math.log10(vmax / target))
+    for m in (1, 2, 2.5, 5, 10):
+        step = m * mag
+        if vmax / step <= target + 1e-9:
+            break
+    top = math.ceil(vmax / step - 1e-9) * step
+    return np.arange(0, top + step / 2, step)
+
+
+def _tick_text(ticks):
+    step = ticks[1] - ticks[0] if len(ticks) > 1 else 1
+    decimals = next(d for d in range(7) if abs(round(step, d) - step) < 1e-9 * max(1, step))
+    return [f"{t:.{decimals}f}" for t in ticks]
+
+
+def _tick_indices(n):
+    return range(0, n, max(1, n // 15) if n > 20 else 1)
+
+
+def _x_positions(n, x0, w, margin):
+    """Data index -> x; ``margin`` is padding on each side as a fraction of the span."""
+    span = max(n - 1, 1)
+    pad = margin * span if n > 1 else 0.5
+    return x0 + w * (np.arange(n) + pad) / (span + 2 * pad)
+
+
+def _layout(n_panels):
+    plot_h = PANEL_HEIGHT - PANEL_TITLE - PANEL_GAP
+    w = WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    boxes = [(MARGIN_LEFT, HEADER_HEIGHT + i * PANEL_HEIGHT + PANEL_TITLE, w, plot_h)
+             for i in range(n_panels)]
+    return boxes, HEADER_HEIGHT + n_panels * PANEL_HEIGHT + FOOTER_HEIGHT
+
+
+def _header(parts, title):
+    for j, line in enumerate(title.splitlines()):
+        parts.append(f'<text class="h" x="{WIDTH / 2:g}" y="{32 + j * 24}">{escape(line)}</text>')
+
+
+def _grid(parts, box, xs, ticks, ymax):
+    x0, y0, w, h = box
+    d = [f"M{_num(x)} {_num(y0)}v{_num(h)}" for x in xs]
+    d += [f"M{_num(x0)} {_num(y0 + h - t / ymax * h)}h{_num(w)}" for t in ticks]
+    parts.append(f'<path class="g" d="{"".join(d)}"/>')
+
+
+def _frame(parts, box, name, xs, ticks, ymax, ylabel):
+    x0, y0, w, h = box
+    parts.append(f'<rect class="a" x="{_num(x0)}" y="{_num(y0)}" width="{_num(w)}" height="{_num(h)}"/>')
+    marks = [f"M{_num(x0)} {_num(y0 + h - t / ymax * h)}h-3.5" for t in ticks]
+    marks += [f"M{_num(x)} {_num(y0 + h)}v3.5" for x in xs]
+    parts.append(f'<path class="a" d="{"".join(marks)}"/>')
+    for t, label in zip(ticks, _tick_text(ticks)):
+        parts.append(f'<text class="r" x="{_num(x0 - 6)}" y="{_num(y0 + h - t / ymax * h + 3.5)}">{label}</text>')
+    cx, cy = x0 - 46, y0 + h / 2
+    parts.append(f'<text class="m" transform="rotate(-90 {_num(cx)} {_num(cy)})" '
+                 f'x="{_num(cx)}" y="{_num(cy)}">{escape(ylabel)}</text>')
+    parts.append(f'<text class="t" x="{_num(x0)}" y="{_num(y0 - 6)}">{escape(name)}</text>')
+
+
+def _legend(parts, box, entries, ncol=1):
+    """Upper-right legend; ``entries`` are (kind, color, label), kind in line/dash/patch."""
+    x0, y0, w, _ = box
+    widths = [24 + _text_width(label, 10) for _, _, label in entries]
+    cols = [max(widths[c::ncol]) for c in range(ncol)]
+    rows = math.ceil(len(entries) / ncol)
+    bw, bh = sum(cols) + 12 * ncol, rows * 16 + 8
+    bx, by = x0 + w - bw - 6, y0 + 6
+    parts.append(f'<rect class="k" x="{_num(bx)}" y="{_num(by)}" width="{_num(bw)}" '
+                 f'height="{bh}" rx="2"/>')
+    for i, (kind, color, label) in enumerate(entries):
+        ex = bx + 8 + sum(cols[:i % ncol]) + 12 * (i % ncol)
+        ey = by + 12 + 16 * (i // ncol)
+        if kind == "patch":
+            parts.append(f'<rect x="{_num(ex)}" y="{_num(ey - 6)}" width="16" height="8" fill="{color}"/>')
+        else:
+            dash = ' stroke-dasharray="5.5 2.4"' if kind == "dash" else ""
+            parts.append(f'<path d="M{_num(ex)} {_num(ey - 2)}h16" stroke="{color}" '
+                         f'stroke-width="1.5"{dash}/>')
+        parts.append(f'<text x="{_num(ex + 22)}" y="{_num(ey + 1.5)}">{escape(label)}</text>')
+
+
+def _footer(parts, box, labels, xs, xlabel, total_height):
+    x0, y0, w, h = box
+    for j, x in zip(_tick_indices(len(labels)), xs):
+        ty = y0 + h + 14
+        parts.append(f'<text class="x" transform="rotate(-45 {_num(x)} {_num(ty)})" '
+                     f'x="{_num(x)}" y="{_num(ty)}">{escape(str(labels[j]))}</text>')
+    parts.append(f'<text class="m" x="{_num(x0 + w / 2)}" y="{total_height - 10}" '
+                 f'style="font-size:12px">{escape(xlabel)}</text>')
+
+
+def _polyline(xs, ys):
+    """Path data through the finite points; NaN values break the line."""
+    d = []
+    pen_up = True
+    for x, y in zip(xs, ys):
+        if not math.isfinite(y):
+            pen_up = True
+            continue
+        d.append(f"{'M' if pen_up else ' '}{_num(x)} {_num(y)}")
+        pen_up = False
+    return "".join(d)
+
+
+def _dots(xs, ys, r):
+    return "".join(f"M{_num(x - r)} {_num(y)}a{r} {r} 0 1 0 {2 * r} 0a{r} {r} 0 1 0 {-2 * r} 0"
+                   for x, y in zip(xs, ys))
+
+
+def _triangles(xs, ys, r):
+    half, rise = _num(r * 0.866), _num(r * 1.5)
+    return "".join(f"M{_num(x)} {_num(y - r)}l{half} {rise}h-{_num(r * 1.732)}z"
+                   for x, y in zip(xs, ys))
+
+
+def _document(height, parts):
+    fonts = ",".join(f"'{f}'" if " " in f else f for f in FONT_STACK)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}pt" height="{height}pt" '
+            f'viewBox="0 0 {WIDTH} {height}">\n<style>{STYLE.format(fonts=fonts)}</style>\n'
+            f'<rect width="100%" height="100%" fill="#fff"/>\n' + "\n".join(parts) + "\n</svg>\n")
+
+
+def _finish(svg, output_path):
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(svg)
+        print(f"圖表已輸出：{output_path}")
+    return svg
+
+
+def line_panels(labels, names, values, output_path=None, *, title="", ylabel="", xlabel="Quarter",
+                ylim=None, threshold=None, threshold_label=None, colors=None):
+    """One line panel per row of ``values`` (names x labels, NaN for gaps); returns the SVG.
+
+    Points above ``threshold`` are drawn as red-edged triangles, the others as dots,
+    and the threshold itself as a dashed red line.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    colors = colors or TAB20
+    ymax = ylim if ylim is not None else float(nice_ticks(np.nanmax(values))[-1])
+    ticks = nice_ticks(ymax)
+    boxes, height = _layout(len(names))
+    parts = []
+    _header(parts, title)
+
+    for i, (name, box) in enumerate(zip(names, boxes)):
+        x0, y0, w, h = box
+        color = colors[i % len(colors)]
+        xs = _x_positions(len(labels), x0, w, 0.05)
+        tick_xs = xs[list(_tick_indices(len(labels)))]
+        ys = y0 + h - values[i] / ymax * h
+        _grid(parts, box, tick_xs, ticks, ymax)
+
+        parts.append(f'<clipPath id="c{i}"><rect x="{_num(x0)}" y="{_num(y0)}" '
+                     f'width="{_num(w)}" height="{_num(h)}"/></clipPath>')
+        parts.append(f'<g clip-path="url(#c{i})">')
+        parts.append(f'<path d="{_polyline(xs, ys)}" fill="none" stroke="{color}" '
+                     f'stroke-width="1.5" stroke-opacity=".6"/>')
+        finite = np.isfinite(values[i])
+        risk = finite & (values[i] > threshold) if threshold is not None else np.zeros_like(finite)
+        normal = finite & ~risk
+        parts.append(f'<path d="{_dots(xs[normal], ys[normal], 2.7)}" fill="{color}"/>')
+        if risk.any():
+            parts.append(f'<path d="{_triangles(xs[risk], ys[risk], 5)}" fill="{color}" '
+                         f'stroke="{RISK_COLOR}"/>')
+        if threshold is not None:
+            ty = y0 + h - threshold / ymax * h
+            parts.append(f'<path d="M{_num(x0)} {_num(ty)}h{_num(w)}" stroke="{RISK_COLOR}" '
+                         f'stroke-width="1.5" stroke-dasharray="5.5 2.4" stroke-opacity=".8"/>')
+        parts.append("</g>")
+
+        _frame(parts, box, name, tick_xs, ticks, ymax, ylabel)
+        entries = [("line", color, name)]
+        if threshold is not None:
+            entries.append(("dash", RISK_COLOR, threshold_label or f"{threshold:g}"))
+        _legend(parts, box, entries)
+
+    xs = _x_positions(len(labels), boxes[-1][0], boxes[-1][2], 0.05)
+    _footer(parts, boxes[-1], labels, xs[list(_tick_indices(len(labels)))], xlabel, height)
+    return _finish(_document(height, parts), output_path)
+
+
+def stacked_panels(labels, names, stacks, output_path=None, *, series_labels, series_colors,
+                   title="", ylabel="", xlabel="Quarter", opacity=0.85):
+    """One stacked-area panel per city; ``stacks`` is (names x labels x series). Returns the SVG."""
+    stacks = np.nan_to_num(np.asarray(stacks, dtype=np.float64))
+    tops = np.cumsum(stacks, axis=2)
+    boxes, height = _layout(len(names))
+    parts = []
+    _header(parts, title)
+
+    for i, (name, box) in enumerate(zip(names, boxes)):
+        x0, y0, w, h = box
+        ticks = nice_ticks(float(tops[i, :, -1].max()))
+        ymax = float(ticks[-1])
+        xs = _x_positions(len(labels), x0, w, 0)
+        tick_xs = xs[list(_tick_indices(len(labels)))]
+        _grid(parts, box, tick_xs, ticks, ymax)
+
+        lower = np.full(len(labels), y0 + h)
+        for k, color in enumerate(series_colors):
+            upper = y0 + h - tops[i, :, k] / ymax * h
+            outline = _polyline(np.r_[xs, xs[::-1]], np.r_[upper, lower[::-1]])
+            parts.append(f'<path d="{outline}z" fill="{color}" fill-opacity="{opacity:g}"/>')
+            lower = upper
+
+        _frame(parts, box, name, tick_xs, ticks, ymax, ylabel)
+        if i == 0:
+            _legend(parts, box, [("patch", c, label) for c, label in zip(series_colors, series_labels)],
+                    ncol=len(series_labels))
+
+    xs = _x_positions(len(labels), boxes[-1][0], boxes[-1][2], 0)
+    _footer(parts, boxes[-1], labels, xs[list(_tick_indices(len(labels)))], xlabel, height)
+    return _finish(_document(height, parts), output_path)
+
+
+def _best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比較原生 SVG 與 matplotlib 繪製各圖表的時間與檔案大小")
+    parser.add_argument("--repeat", type=int, default=5, help="每張圖重複繪製次數（取最佳）")
+    parser.add_argument("--matplotlib", action="store_true", help="一併計時 matplotlib 繪圖")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fetch_and_plot
+    import fetch_transaction_trend
+
+    jobs = (fetch_and_plot.figure_jobs() + fetch_transaction_trend.figure_jobs()
+            + fetch_and_plot.figure_jobs(all_cities=True)
+            + fetch_transaction_trend.figure_jobs(all_cities=True))
+    mpl_jobs = {}
+    if args.matplotlib:
+        for job in (fetch_and_plot.figure_jobs(renderer="matplotlib")
+                    + fetch_transaction_trend.figure_jobs(renderer="matplotlib")):
+            mpl_jobs[job.name] = job
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for job in jobs:
+            t = _best_of(lambda: job.render(*job.args, **job.params), args.repeat)
+            size = len(job.render(*job.args, **job.params).encode("utf-8"))
+            row = [job.name, len(job.args[1]), t, size, None, None]
+            mpl = mpl_jobs.get(job.name)
+            if mpl is not None:
+                mpl_out = os.path.join(tmp, job.name + ".mpl.svg")
+                t0 = time.perf_counter()
+                mpl.render(*mpl.args, **mpl.params, output_path=mpl_out)
+                row[4:] = [time.perf_counter() - t0, os.path.getsize(mpl_out)]
+            rows.append(row)
+
+    print(f"\n{'圖表':<26}{'面板':>5}{'原生耗時':>10}{'原生 SVG':>12}"
+          + (f"{'matplotlib':>12}{'SVG':>12}" if args.matplotlib else ""))
+    for name, panels, t, size, t_mpl, size_mpl in rows:
+        line = f"{name:<26}{panels:>5}{t * 1000:>8.1f}ms{size:>12,}"
+        if t_mpl is not None:
+            line += f"{t_mpl * 1000:>10.0f}ms{size_mpl:>12,}"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Compact SVG output: text as <text>, rounded coordinates, de-duplicated marker defs.
+
+matplotlib's default SVG draws every glyph as a path and writes coordinates
+with six decimals. In compact mode save_figure() instead:
+
+* keeps text as ``<text>`` with a CJK font stack (svg.fonttype = none),
+* rounds the numbers in geometry attributes (GEOMETRY_ATTRS) to PRECISION
+  decimals and drops the path command letters SVG implies; styles, opacity
+  and colours are left as written,
+* collapses identical ``<defs>`` paths (scatter markers are defined once per
+  collection) into one definition, turns repeated inline styles into CSS
+  classes, and drops unreferenced ids and the date metadata.
+
+An optional PNG/WebP copy is written next to the SVG.
+
+    python scripts/svg_compact.py                # size / render-time report per figure
+    python scripts/svg_compact.py --raster webp
+"""
+import argparse
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+PRECISION = 1                # decimals kept in coordinates (1/10 pt)
+GEOMETRY_ATTRS = frozenset(["d", "points", "x", "y", "x1", "y1", "x2", "y2", "cx", "cy",
+                            "r", "rx", "ry", "width", "height", "transform", "viewBox"])
+RASTER_DPI = 100
+FONT_STACK = ["Noto Sans CJK TC", "Microsoft JhengHei", "PingFang TC", "Heiti TC",
+              "WenQuanYi Micro Hei", "sans-serif"]
+
+_ATTR_RE = re.compile(r'(\s[\w:-]+)="([^"]*)"')
+_NUMBER_RE = re.compile(r"-?\d+\.\d+")
+_DEF_PATH_RE = re.compile(r'<path id="([^"]+)" d="([^"]*)"([^>]*)/>')
+
+
+def _round_numbers(value, precision):
+    def fmt(m):
+        text = f"{float(m.group(0)):.{precision}f}".rstrip("0").rstrip(".")
+        return "0" if text in ("-0", "") else text
+    return _NUMBER_RE.sub(fmt, value)
+
+
+def _compact_path(d):
+    """Drop command letters that SVG implies (pairs after M or L are line-tos)."""
+    out = []
+    implied = None
+    for token in d.split():
+        if token.isalpha():
+            if token == implied:
+                continue
+            implied = "L" if token in ("M", "L") else (token if token in ("C", "Q") else None)
+        out.append(token)
+    return " ".join(out)
+
+
+def _share_styles(svg):
+    """Turn repeated inline styles into CSS classes and drop ids nothing refers to."""
+    referenced = set(re.findall(r'(?:href="#|url\(#)([^")]+)', svg))
+    svg = re.sub(r' id="([^"]+)"', lambda m: m.group(0) if m.group(1) in referenced else "", svg)
+
+    counts = {}
+    for style in re.findall(r' style="([^"]+)"', svg):
+        counts[style] = counts.get(style, 0) + 1
+    shared = {style: f"s{i}" for i, style in
+              enumerate(st for st, n in sorted(counts.items(), key=lambda kv: -kv[1]) if n > 1)}
+    if not shared:
+        return svg
+    svg = re.sub(r' style="([^"]+)"',
+                 lambda m: f' class="{shared[m.group(1)]}"' if m.group(1) in shared else m.group(0),
+                 svg)
+    rules = "".join(f".{name}{{{style}}}" for style, name in shared.items())
+    return svg.replace("</style>", rules + "</style>", 1)
+
+
+def compact_svg(svg, precision=PRECISION):
+    """Return ``svg`` with rounded coordinates, shared marker defs and no metadata."""
+    svg = re.sub(r"\s*<metadata>.*?</metadata>", "", svg, flags=re.S)
+
+    # Identical path definitions -> keep the first id, point every <use> at it.
+    first_id = {}
+    alias = {}
+
+    def dedupe(m):
+        pid, d, rest = m.groups()
+        key = (d, rest)
+        if key in first_id:
+            alias[pid] = first_id[key]
+            return ""
+        first_id[key] = pid
+        return m.group(0)
+
+    svg = _DEF_PATH_RE.sub(dedupe, svg)
+    if alias:
+        svg = re.sub(r'xlink:href="#([^"]+)"',
+                     lambda m: f'xlink:href="#{alias.get(m.group(1), m.group(1))}"', svg)
+        svg = re.sub(r"\s*<defs>\s*</defs>", "", svg)
+
+    def attr(m):
+        name, value = m.groups()
+        if name.strip() not in GEOMETRY_ATTRS:
+            return m.group(0)
+        value = _round_numbers(value, precision)
+        value = re.sub(r"\s*\n\s*", " ", value).strip()
+        if name.strip() == "d":
+            value = _compact_path(value)
+        return f'{name}="{value}"'
+
+    svg = _ATTR_RE.sub(attr, svg)
+    svg = _share_styles(svg)
+    # matplotlib indents one space per nesting level; it carries no meaning.
+    return "\n".join(line.strip() for line in svg.splitlines() if line.strip()) + "\n"
+
+
+def save_figure(fig, output_path, compact=False, raster=None, dpi=RASTER_DPI):
+    """Save ``fig`` as SVG (compact or matplotlib's default) plus an optional raster copy."""
+    import matplotlib.pyplot as plt
+
+    if compact:
+        current = [f for f in plt.rcParams["font.sans-serif"] if f != "sans-serif"]
+        stack = current + [f for f in FONT_STACK if f not in current]
+        with plt.rc_context({"svg.fonttype": "none", "font.sans-serif": stack}):
+            buf = io.StringIO()
+            fig.savefig(buf, format="svg")
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(compact_svg(buf.getvalue()))
+    else:
+        fig.savefig(output_path, format="svg")
+
+    if raster:
+        fig.savefig(os.path.splitext(output_path)[0] + "." + raster, format=raster, dpi=dpi)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比較各圖表的標準與精簡 SVG 大小及繪製時間")
+    parser.add_argument("--raster", choices=("png", "webp"), default=None,
+                        help="一併輸出點陣圖並列出大小")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fetch_and_plot
+    import fetch_transaction_trend
+
+    jobs = (fetch_and_plot.figure_jobs(renderer="matplotlib")
+            + fetch_transaction_trend.figure_jobs(renderer="matplotlib"))
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for job in jobs:
+            base = os.path.join(tmp, os.path.basename(job.output))
+            compact = os.path.splitext(base)[0] + ".compact.svg"
+            t0 = time.perf_counter()
+            job.render(*job.args, **job.params, output_path=base)
+            t1 = time.perf_counter()
+            job.render(*job.args, **{**job.params, "compact": True}, output_path=compact)
+            t2 = time.perf_counter()
+            raster_size = None
+            if args.raster:
+                job.render(*job.args, **{**job.params, "compact": True, "raster": args.raster},
+                           output_path=compact)
+                raster_size = os.path.getsize(os.path.splitext(compact)[0] + "." + args.raster)
+            rows.append((job.name, os.path.getsize(base), t1 - t0,
+                         os.path.getsize(compact), t2 - t1, raster_size))
+
+    print(f"\n{'圖表':<18}{'標準 SVG':>12}{'耗時':>8}{'精簡 SVG':>12}{'耗時':>8}{'縮減':>8}"
+          + (f"{args.raster.upper():>12}" if args.raster else ""))
+    for name, size, t_std, compact_size, t_compact, raster_size in rows:
+        line = (f"{name:<18}{size:>12,}{t_std:>7.2f}s{compact_size:>12,}{t_compact:>7.2f}s"
+                f"{1 - compact_size / size:>8.0%}")
+        if raster_size is not None:
+            line += f"{raster_size:>12,}"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
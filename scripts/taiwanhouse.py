@@ -0,0 +1,117 @@
+"""Single entry point for both datasets: fetch, plot, report, or all three steps.
+
+    python scripts/taiwanhouse.py all                                    # every dataset, like the workflow
+    python scripts/taiwanhouse.py fetch ownership --workers 5 --incremental
+    python scripts/taiwanhouse.py plot --renderer matplotlib --compact-svg
+    python scripts/taiwanhouse.py report default-rate
+
+Datasets default to all of them. A command imports only its datasets'
+modules, and those load selenium or matplotlib only inside the step that
+needs them, so `fetch ownership` never imports either. fetch, plot and all
+run as one pipeline (pipeline.py): each dataset downloads, derives and
+renders on its own chain of stages, so one failing source does not hold
+back the other; derived outputs whose inputs did not change are skipped,
+and the stage timings and critical path are printed at the end.
+
+Exit codes of fetch, plot and all: 0 every dataset succeeded (for fetch and
+all, with new data), 1 some dataset failed or kept its existing data, 2 no
+dataset succeeded. report: 0 or 2.
+"""
+import argparse
+import importlib
+import sys
+
+import metrics
+import pipeline
+
+DATASETS = {
+    "default-rate": "fetch_and_plot",            # E3030 購置住宅貸款違約率
+    "ownership": "fetch_transaction_trend",      # statis 建物所有權登記
+}
+COMMANDS = {
+    "fetch": "下載並寫入資料，不繪圖",
+    "plot": "依現有資料重繪圖表（輸入未變更者略過）",
+    "report": "列出最新一季摘要",
+    "all": "下載、繪圖，取得新資料時更新 README 時間戳",
+}
+
+
+def _module(dataset):
+    return importlib.import_module(DATASETS[dataset])
+
+
+def build_parser(command=None, datasets=()):
+    """Parser whose options are those of ``command`` for ``datasets`` (imports only their modules)."""
+    parser = argparse.ArgumentParser(
+        description="TaiwanHouse 資料更新：" + "；".join(f"{c} {h}" for c, h in COMMANDS.items()))
+    parser.add_argument("command", choices=list(COMMANDS), help="要執行的步驟")
+    parser.add_argument("datasets", nargs="*", metavar="dataset",
+                        help=f"資料集：{'、'.join(DATASETS)}（預設全部）")
+    metrics.add_arguments(parser)
+
+    if command in ("fetch", "all"):
+        for dataset in datasets:
+            _module(dataset).add_fetch_arguments(parser.add_argument_group(f"{dataset} 下載選項"))
+        parser.add_argument("--force-stages", action="store_true",
+                            help="即使輸入未變更也重新執行衍生資料等階段")
+    if command in ("plot", "all"):
+        from render_cache import add_render_arguments
+        group = parser.add_argument_group("繪圖選項")
+        group.add_argument("--force-render", action="store_true", help="即使輸入資料未變更也重繪圖表")
+        group.add_argument("--render-workers", type=int, default=None,
+                           help="並行繪圖的行程數（預設為 CPU 核心數）")
+        add_render_arguments(group)
+    return parser
+
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Which modules' options to offer depends on the command and datasets,
+    # so pick those out before building the real parser.
+    command = next((a for a in argv if not a.startswith("-")), None)
+    datasets = [a for a in argv if a in DATASETS] or list(DATASETS)
+    parser = build_parser(command if command in COMMANDS else None, datasets)
+    args = parser.parse_intermixed_args(argv)
+    unknown = [d for d in args.datasets if d not in DATASETS]
+    if unknown:
+        parser.error(f"未知的資料集：{', '.join(unknown)}（可用：{', '.join(DATASETS)}）")
+    args.datasets = list(dict.fromkeys(args.datasets)) or list(DATASETS)
+    if args.command in ("plot", "all"):
+        from render_cache import check_render_arguments
+        check_render_arguments(parser, args)
+    return args
+
+
+def run(args):
+    modules = {dataset: _module(dataset) for dataset in args.datasets}
+
+    if args.command == "report":
+        try:
+            for module in modules.values():
+                module.report()
+        except Exception as e:
+            print(f"摘要產生失敗：{e}")
+            return 2
+        return 0
+
+    stages = pipeline.build(modules, args, args.command)
+    ctx = pipeline.run(stages, force=getattr(args, "force_stages", False))
+    failed = pipeline.failed_datasets(stages, ctx)
+    if len(failed) == len(modules):
+        return 2
+    if failed or ctx.status.get("readme") == "failed":
+        return 1
+    if args.command == "plot":
+        return 0
+    return 0 if len(pipeline.fresh_datasets(stages, ctx)) == len(modules) else 1
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with metrics.session(f"taiwanhouse {args.command}", profile=args.profile) as session:
+        session["exit"] = run(args)
+    return session["exit"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""Transfer-count monitor: 建物買賣移轉棟數 per county with QoQ / YoY changes.
+
+Derived from the 買賣_棟數 column that fetch_transaction_trend.py already
+downloads, so it needs no request of its own. update() lays the counts out
+as a (city x quarter) array over a contiguous quarter range and takes the
+previous quarter and the same quarter a year earlier as shifts by 1 and 4
+along the quarter axis, for every county and the national total at once.
+It writes:
+
+    data/csv/taiwan_building_transfer_count.csv       every county and quarter (the published three columns)
+    data/reports/taiwan_building_transfer_monitor.md  latest quarter with its changes, national and per county
+    data/svg/taiwan_building_transfer_count.svg       national total (a FigureJob, render-cached)
+
+Both texts follow from the counts alone, and each file is rewritten only
+when its text changes.
+
+    python scripts/transfer_monitor.py            # refresh outputs from the ownership CSV
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import cities
+import common
+import periods
+import svg_charts
+import warehouse
+from columnar_store import read_dataset, write_dataset
+from common import DATA_DIR, PROJECT_ROOT, SVG_DIR
+from font_cache import resolve_cjk_font
+from render_cache import FigureJob, render_figures
+from svg_compact import save_figure
+
+SOURCE_DATASET = "building_ownership_trend"
+SOURCE_COLUMN = "買賣_棟數"
+DATASET = "taiwan_building_transfer_count"
+CSV_OUTPUT = os.path.join(DATA_DIR, f"{DATASET}.csv")
+SVG_OUTPUT = os.path.join(SVG_DIR, f"{DATASET}.svg")
+REPORT_DIR = os.path.join(PROJECT_ROOT, "data", "reports")
+REPORT_OUTPUT = os.path.join(REPORT_DIR, "taiwan_building_transfer_monitor.md")
+SOURCE_URL = "https://statis.moi.gov.tw/micst/webMain.aspx?sys=220&kind=21&type=1&funid=c0510302"
+
+COUNT_COLUMN = "建物買賣移轉登記棟數"
+SPELLING = "e3030"   # 台 and 全國 in the CSV and the report, as the published CSV always had
+LAGS = {"較上季": 1, "較去年同季": 4}
+
+AREA_COLOR = "#2196F3"
+CHART_TITLE = "Quarterly Building Transfer Registrations — Taiwan\n（全台建物買賣移轉棟數）"
+
+
+# ── data ───────────────────────────────────────────────────────────────────
+
+def transfer_counts(df=None):
+    """Counts as (city codes, period codes, counts[city, period]), NaN where a quarter is missing.
+
+    ``df`` is the ownership dataset as read_dataset(..., labels=False) returns
+    it; rows are the national total and every current county, in code order.
+    """
+    if df is None:
+        df = read_dataset(SOURCE_DATASET, columns=[SOURCE_COLUMN], labels=False)
+    city = cities.encode(df["city"])
+    keep = (city != cities.UNKNOWN) & ~cities.is_former(city)
+    city, period = city[keep], df["period"].to_numpy()[keep]
+    codes = np.arange(period.min(), period.max() + 1, dtype=np.int16)
+    city_codes = np.unique(city)
+    counts = np.full((len(city_codes), len(codes)), np.nan)
+    counts[np.searchsorted(city_codes, city), period - codes[0]] = df[SOURCE_COLUMN].to_numpy(dtype=float)[keep]
+    return city_codes, codes, counts
+
+
+def changes(counts):
+    """{lag name: (difference, percent change)} against the quarter ``lag`` steps earlier."""
+    out = {}
+    for name, lag in LAGS.items():
+        before = np.full_like(counts, np.nan)
+        before[:, lag:] = counts[:, :-lag]
+        diff = counts - before
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(before > 0, diff / before * 100, np.nan)
+        out[name] = (diff, pct)
+    return out
+
+
+def transfer_csv(city_codes, codes, counts):
+    """CSV text, one row per (quarter, city) with a count, quarters oldest first.
+
+    The columns and the float-formatted counts are those the published CSV
+    has always had. Written by hand: every field is a label or a number, and
+    joining the formatted columns is several times faster than DataFrame.to_csv.
+    """
+    p, c = np.nonzero(np.isfinite(counts).T)
+    rows = zip(periods.roc_label(codes[p]).tolist(), cities.labels(city_codes[c], SPELLING).tolist(),
+               map(repr, counts[c, p].tolist()))
+    return "\n".join([f"資料期別,縣市,{COUNT_COLUMN}"] + [",".join(row) for row in rows]) + "\n"
+
+
+# ── report ─────────────────────────────────────────────────────────────────
+
+def _change_text(diff, pct):
+    if not np.isfinite(diff):
+        return "—"
+    return f"{diff:+,.0f} 棟 ({pct:+.2f}%)" if np.isfinite(pct) else f"{diff:+,.0f} 棟"
+
+
+def _cell(v, fmt):
+    return format(v, fmt) if np.isfinite(v) else "—"
+
+
+def render_report(city_codes, codes, counts):
+    """The monitor report for the newest quarter with a national count, as markdown."""
+    delta = changes(counts)
+    total = np.flatnonzero(city_codes == cities.TOTAL)[0]
+    latest = np.flatnonzero(np.isfinite(counts[total]))[-1]
+    (q_diff, q_pct), (y_diff, y_pct) = delta["較上季"], delta["較去年同季"]
+
+    lines = [
+        "# 全台建物買賣移轉棟數監控",
+        "",
+        f"- 最新期別：{periods.gregorian_label(codes[latest:latest + 1])[0]}",
+        f"- 最新棟數：{counts[total, latest]:,.0f}",
+        f"- 與前一期差異：{_change_text(q_diff[total, latest], q_pct[total, latest])}",
+        f"- 與去年同期差異：{_change_text(y_diff[total, latest], y_pct[total, latest])}",
+        "",
+        f"## 各縣市（{periods.roc_label(codes[latest:latest + 1])[0]}）",
+        "",
+        "| 縣市 | 棟數 | 較上季 | 較上季(%) | 較去年同季 | 較去年同季(%) |",
+        "|---|---:|---:|---:|---:|---:|",
+    ]
+    for i, name in enumerate(cities.labels(city_codes, SPELLING)):
+        lines.append(f"| {name} | {_cell(counts[i, latest], ',.0f')} "
+                     f"| {_cell(q_diff[i, latest], '+,.0f')} | {_cell(q_pct[i, latest], '+.2f')} "
+                     f"| {_cell(y_diff[i, latest], '+,.0f')} | {_cell(y_pct[i, latest], '+.2f')} |")
+    lines += [
+        "",
+        "## 檔案位置",
+        f"- CSV：`{os.path.relpath(CSV_OUTPUT, PROJECT_ROOT)}`",
+        f"- SVG：`{os.path.relpath(SVG_OUTPUT, PROJECT_ROOT)}`",
+        "",
+        "## 資料來源",
+        f"- 內政部統計查詢網 建物所有權登記（買賣移轉棟數）：{SOURCE_URL}",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _rewrite(path, text, encoding):
+    """Write ``text`` to ``path`` unless it already holds exactly that; returns True when written."""
+    try:
+        with open(path, encoding=encoding, newline="") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write(text)
+    return True
+
+
+def update(df=None):
+    """Rewrite the CSV and report from the ownership data; returns True when either changed."""
+    t0 = time.perf_counter()
+    city_codes, codes, counts = transfer_counts(df)
+    written = [path for path, text, encoding in [
+        (CSV_OUTPUT, transfer_csv(city_codes, codes, counts), "utf-8-sig"),
+        (REPORT_OUTPUT, render_report(city_codes, codes, counts), "utf-8"),
+    ] if _rewrite(path, text, encoding)]
+    elapsed = (time.perf_counter() - t0) * 1000
+    if written:
+        print(f"買賣移轉棟數已更新：{'、'.join(written)}（{elapsed:.1f} ms）")
+    else:
+        print(f"買賣移轉棟數未變更（{elapsed:.1f} ms）")
+    if CSV_OUTPUT in written:
+        parquet = write_dataset(DATASET)
+        if parquet:
+            print(f"欄式副本已儲存：{parquet}")
+    # Also when the CSV is unchanged: the warehouse may be missing or behind it.
+    warehouse.refresh([DATASET])
+    return bool(written)
+
+
+# ── plot ───────────────────────────────────────────────────────────────────
+
+def plot_transfer_count(codes, counts, output_path=None, compact=False, raster=None):
+    """National transfer count as a filled line chart (matplotlib renderer)."""
+    print("繪製全台建物買賣移轉棟數圖...")
+    plt = common.pyplot()
+    font_name = resolve_cjk_font()
+    plt.rcParams["font.sans-serif"] = [font_name, "sans-serif"] if font_name else ["sans-serif"]
+    plt.rcParams["axes.unicode_minus"] = False
+
+    labels = periods.gregorian_label(codes)
+    x = np.arange(len(codes))
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.fill_between(x, counts / 1000, color=AREA_COLOR, alpha=0.35)
+    ax.plot(x, counts / 1000, color=AREA_COLOR, linewidth=1.5)
+    ax.set_ylabel("棟數 (千棟)", fontsize=10)
+    ax.set_ylim(bottom=0)
+    ax.grid(True, linestyle="--", alpha=0.5)
+    step = max(1, len(codes) // 15) if len(codes) > 20 else 1
+    ax.set_xticks(x[::step])
+    ax.set_xticklabels(list(labels[::step]), rotation=45, fontsize=12)
+    ax.set_xlabel("Quarter", fontsize=12)
+    fig.suptitle(CHART_TITLE, fontsize=18)
+    plt.tight_layout(rect=[0, 0.03, 1, 0.97])
+    save_figure(fig, output_path, compact=compact, raster=raster)
+    plt.close(fig)
+    print(f"圖表已輸出：{output_path}")
+
+
+def figure_jobs(compact=False, raster=None, renderer="native"):
+    """The national transfer-count chart as a FigureJob named 'transfer_count'."""
+    city_codes, codes, counts = transfer_counts()
+    national = counts[np.flatnonzero(city_codes == cities.TOTAL)[0]]
+    shown = np.isfinite(national)
+    codes, national = codes[shown], national[shown]
+    if renderer == "matplotlib":
+        return [FigureJob("transfer_count", SVG_OUTPUT, plot_transfer_count, (codes, national),
+                          params={"compact": compact, "raster": raster})]
+    return [FigureJob("transfer_count", SVG_OUTPUT, svg_charts.stacked_panels,
+                      (periods.gregorian_label(codes).tolist(), ["全國"], national[None, :, None] / 1000),
+                      params={"series_labels": ["買賣移轉"], "series_colors": [AREA_COLOR],
+                              "title": CHART_TITLE, "ylabel": "棟數 (千棟)"})]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由建物所有權登記資料產生買賣移轉棟數 CSV、監控報告與圖表")
+    parser.add_argument("--force-render", action="store_true", help="即使輸入資料未變更也重繪圖表")
+    args = parser.parse_args(argv)
+    update()
+    render_figures(figure_jobs(), force=args.force_render)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
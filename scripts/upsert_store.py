@@ -0,0 +1,102 @@
+"""Keyed upsert of a downloaded table into a published CSV, with per-row provenance.
+
+upsert_csv() matches a fresh download against the stored rows on their key
+columns (period, city) and writes only what differs. Every row carries
+``download_timestamp`` (the run its key first appeared in) and
+``process_timestamp`` (the run its values last changed in), so unchanged
+rows stay byte-identical and a git diff or downstream sync sees exactly the
+inserted and revised rows. The column names are those of the published
+schema that biztrends.TW consumes.
+
+The CSV itself is the append log: a new quarter is appended to the end of
+the file. Only revisions of stored rows, or keys that would not sort last,
+rewrite it, and the rewrite keeps the existing order, values text and line
+endings. Stored keys missing from a download are kept.
+"""
+import os
+from datetime import datetime
+
+import pandas as pd
+
+import periods
+
+FIRST_SEEN = "download_timestamp"
+LAST_CHANGED = "process_timestamp"
+TIMESTAMP_COLUMNS = [FIRST_SEEN, LAST_CHANGED]
+
+
+def timestamp_now():
+    import pytz
+    return datetime.now(pytz.timezone("Asia/Taipei")).strftime("%Y-%m-%d %H:%M:%S CST")
+
+
+def _line_terminator(path):
+    with open(path, "rb") as f:
+        first = f.readline()
+    return "\r\n" if first.endswith(b"\r\n") else "\n"
+
+
+def _as_text(df):
+    """Values as the strings the CSV holds ('' for missing), so rewrites keep their text."""
+    return df.astype(object).where(df.notna(), "").astype(str)
+
+
+def _changed(old, new):
+    """Rows whose values differ, comparing numerically where both sides parse ('0.30' == '0.3')."""
+    same_text = old.to_numpy() == new.to_numpy()
+    a = old.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    b = new.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    return ~(same_text | (a == b)).all(axis=1)
+
+
+def upsert_csv(path, df, keys, values, period, now=None):
+    """Merge ``df`` into the CSV at ``path``; returns counts of inserted/changed/unchanged rows.
+
+    ``keys`` identify a row, ``values`` are compared and stored, ``period`` is
+    the key column holding 'NNNQn' labels that orders the file.
+    """
+    now = now or timestamp_now()
+    new = _as_text(df[keys + values]).drop_duplicates(keys, keep="last").set_index(keys)
+    counts = {"inserted": 0, "changed": 0, "unchanged": 0}
+
+    if not os.path.exists(path):
+        rows = new.assign(**{col: now for col in TIMESTAMP_COLUMNS}).reset_index()
+        rows.to_csv(path, index=False, encoding="utf-8-sig")
+        counts["inserted"] = len(rows)
+        return counts
+
+    old = pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False).set_index(keys)
+    missing = [c for c in values + TIMESTAMP_COLUMNS if c not in old.columns]
+    if missing:
+        raise ValueError(f"{path} 缺少欄位：{', '.join(missing)}")
+
+    seen = new.index.isin(old.index)
+    inserted = new[~seen].assign(**{col: now for col in TIMESTAMP_COLUMNS})
+    common_keys = new.index[seen]
+    revised = common_keys[_changed(old.loc[common_keys, values], new.loc[common_keys, values])]
+    counts.update(inserted=len(inserted), changed=len(revised),
+                  unchanged=len(common_keys) - len(revised))
+    if not len(inserted) and not len(revised):
+        return counts
+
+    lineterminator = _line_terminator(path)
+    appendable = not len(revised) and (
+        periods.encode(inserted.index.get_level_values(period)).min()
+        > periods.encode(old.index.get_level_values(period)).max())
+    if appendable:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+        with open(path, "a", encoding="utf-8", newline="") as f:
+            if needs_newline:
+                f.write(lineterminator)
+            inserted.reset_index()[old.index.names + list(old.columns)].to_csv(
+                f, header=False, index=False, lineterminator=lineterminator)
+        return counts
+
+    old.loc[revised, values] = new.loc[revised, values]
+    old.loc[revised, LAST_CHANGED] = now
+    rows = pd.concat([old, inserted[old.columns]]).reset_index()
+    order = periods.encode(rows[period]).argsort(kind="stable")
+    rows.iloc[order].to_csv(path, index=False, encoding="utf-8-sig", lineterminator=lineterminator)
+    return counts
@@ -0,0 +1,273 @@
+"""Local SQLite warehouse joining the three data/csv datasets on (city, period).
+
+Each dataset is a table keyed on (city, period) with English column names,
+the period as the integer code of periods.py and the city as its code in
+the cities dimension (cities.py, also stored as the ``cities`` table).
+mv_rate_volume is a materialized join of the default rate with 買賣/拍賣
+registrations and transfer counts per city-quarter.
+
+refresh() is called by the fetch steps after they write a CSV. It reloads
+only datasets whose CSV changed, applies only the rows that differ, and
+recomputes the materialized rows of the affected (city, period) keys. The
+database lives in .cache/ and can be rebuilt from data/csv at any time; a
+file SQLite cannot read is rebuilt by refresh(). is_current() lets the
+pipeline re-run a derive stage whose warehouse tables are missing or behind.
+
+    python scripts/warehouse.py                       # refresh, row counts, lookup timing
+    python scripts/warehouse.py --sql "SELECT * FROM mv_rate_volume WHERE city = (SELECT code FROM cities WHERE name = '桃園市')"
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import cities
+import periods
+from columnar_store import DATASETS, csv_path, read_dataset
+from common import CACHE_ROOT, file_sha256
+
+DB_PATH = os.path.join(CACHE_ROOT, "warehouse.sqlite")
+SCHEMA_VERSION = 2   # PRAGMA user_version; an older file is rebuilt from the CSVs
+
+# table -> source dataset and its value columns (CSV name -> column name)
+TABLES = {
+    "default_rate": {
+        "dataset": "housing_loan_default_rate",
+        "columns": {"本季購置住宅貸款違約率(%)": "rate"},
+    },
+    "ownership": {
+        "dataset": "building_ownership_trend",
+        "columns": {
+            "買賣_棟數": "sale_units", "買賣_坪數": "sale_area",
+            "拍賣_棟數": "auction_units", "拍賣_坪數": "auction_area",
+            "繼承_棟數": "inherit_units", "繼承_坪數": "inherit_area",
+            "贈與_棟數": "gift_units", "贈與_坪數": "gift_area",
+        },
+    },
+    "transfer_count": {
+        "dataset": "taiwan_building_transfer_count",
+        "columns": {"建物買賣移轉登記棟數": "transfer_units"},
+    },
+}
+
+MV_COLUMNS = {
+    "rate": "d.rate",
+    "sale_units": "o.sale_units", "sale_area": "o.sale_area",
+    "auction_units": "o.auction_units", "auction_area": "o.auction_area",
+    "transfer_units": "t.transfer_units",
+}
+
+
+class Warehouse:
+    """Connection to the warehouse file; the schema is created on first use unless ``readonly``."""
+
+    def __init__(self, path=DB_PATH, readonly=False):
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self._create()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _create(self):
+        conn = self.conn
+        with conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                for table in ["sources", "cities", "mv_rate_volume"] + list(TABLES):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("CREATE TABLE IF NOT EXISTS sources ("
+                         "dataset TEXT PRIMARY KEY, sha256 TEXT, rows INTEGER, loaded_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cities (code INTEGER PRIMARY KEY, name TEXT, "
+                         "statis TEXT, e3030 TEXT, english TEXT, kind TEXT, successor INTEGER)")
+            dim = cities.DIMENSION
+            conn.executemany("INSERT OR REPLACE INTO cities VALUES (?, ?, ?, ?, ?, ?, ?)", zip(
+                dim.index.tolist(), dim["name"], dim["statis"], dim["e3030"], dim["english"], dim["kind"],
+                [None if pd.isna(s) else int(s) for s in dim["successor"]]))
+            for table, spec in TABLES.items():
+                cols = ", ".join(f"{c} REAL" for c in spec["columns"].values())
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (city INTEGER, period INTEGER, {cols}, "
+                             "PRIMARY KEY (city, period)) WITHOUT ROWID")
+            cols = ", ".join(f"{c} REAL" for c in MV_COLUMNS)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS mv_rate_volume (city INTEGER, period INTEGER, {cols}, "
+                         "PRIMARY KEY (city, period)) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS mv_rate_volume_period ON mv_rate_volume (period)")
+
+    def _frame(self, table):
+        """The dataset's rows in table layout, one row per (city, period)."""
+        spec = TABLES[table]
+        source = DATASETS[spec["dataset"]]
+        df = read_dataset(spec["dataset"], columns=list(spec["columns"]), labels=False)
+        out = pd.DataFrame({"city": cities.encode(df[source["city"]]).astype(np.int64),
+                            "period": df[source["period"]].to_numpy(dtype=np.int64)})
+        for src, col in spec["columns"].items():
+            out[col] = pd.to_numeric(df[src], errors="coerce").astype(float)
+        # A raw 臺/台 pair would collide on one code; the later row wins.
+        out = out[out["city"] != cities.UNKNOWN]
+        return out.drop_duplicates(["city", "period"], keep="last")
+
+    def _load(self, table, df):
+        """Apply ``df`` to ``table`` row by row difference; returns the touched (city, period) keys."""
+        cols = ["city", "period"] + list(TABLES[table]["columns"].values())
+        conn = self.conn
+        conn.execute(f"CREATE TEMP TABLE incoming AS SELECT {', '.join(cols)} FROM {table} WHERE 0")
+        try:
+            conn.executemany(f"INSERT INTO incoming VALUES ({', '.join('?' * len(cols))})",
+                             df[cols].astype(object).where(df[cols].notna(), None).itertuples(index=False))
+            changed = conn.execute(f"SELECT * FROM incoming EXCEPT SELECT * FROM {table}").fetchall()
+            removed = conn.execute(f"SELECT city, period FROM {table} "
+                                   "EXCEPT SELECT city, period FROM incoming").fetchall()
+        finally:
+            conn.execute("DROP TABLE incoming")
+        conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * len(cols))})", changed)
+        conn.executemany(f"DELETE FROM {table} WHERE city = ? AND period = ?", removed)
+        return [row[:2] for row in changed] + removed
+
+    def _refresh_mv(self, keys):
+        select = ", ".join(MV_COLUMNS.values())
+        self.conn.executemany("DELETE FROM mv_rate_volume WHERE city = ? AND period = ?", keys)
+        self.conn.executemany(
+            f"INSERT INTO mv_rate_volume SELECT k.city, k.period, {select} "
+            "FROM (SELECT ? AS city, ? AS period) k "
+            "LEFT JOIN default_rate d ON d.city = k.city AND d.period = k.period "
+            "LEFT JOIN ownership o ON o.city = k.city AND o.period = k.period "
+            "LEFT JOIN transfer_count t ON t.city = k.city AND t.period = k.period "
+            "WHERE d.city IS NOT NULL OR o.city IS NOT NULL OR t.city IS NOT NULL", keys)
+
+    def stale(self, datasets=None, force=False):
+        """{table: CSV hash} of the tables whose CSV exists and differs from the one last loaded.
+
+        ``force`` counts every table with a CSV as stale.
+        """
+        wanted = [t for t, spec in TABLES.items() if datasets is None or spec["dataset"] in datasets]
+        stale = {}
+        for table in wanted:
+            dataset = TABLES[table]["dataset"]
+            if not os.path.exists(csv_path(dataset)):
+                continue
+            sha = file_sha256(csv_path(dataset))
+            row = self.conn.execute("SELECT sha256 FROM sources WHERE dataset = ?", (dataset,)).fetchone()
+            if force or row is None or row[0] != sha:
+                stale[table] = sha
+        return stale
+
+    def refresh(self, datasets=None, force=False):
+        """Bring tables and views up to date with data/csv; returns {dataset: touched rows}.
+
+        Datasets whose CSV is missing or unchanged since the last refresh are skipped.
+        """
+        touched = {}
+        with self.conn:
+            keys = set()
+            for table, sha in self.stale(datasets, force).items():
+                dataset = TABLES[table]["dataset"]
+                df = self._frame(table)
+                table_keys = self._load(table, df)
+                keys.update(table_keys)
+                touched[dataset] = len(table_keys)
+                self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                                  (dataset, sha, len(df), time.time()))
+            self._refresh_mv(sorted(keys))
+        return touched
+
+    def lookup(self, city, period):
+        """mv_rate_volume row for a city name (any spelling) and a 'NNNQn' period as a dict, or None."""
+        cur = self.conn.execute("SELECT * FROM mv_rate_volume WHERE city = ? AND period = ?",
+                                (cities.resolve(city), periods.parse(period)))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([d[0] for d in cur.description], row))
+
+    def query(self, sql, params=()):
+        """Run ``sql`` and return a DataFrame with ``city`` codes as names and ``period`` as 'NNNQn'."""
+        df = pd.read_sql_query(sql, self.conn, params=params)
+        if "city" in df and len(df):
+            df["city"] = cities.labels(df["city"].to_numpy(dtype=np.int64), "name")
+        if "period" in df and len(df):
+            df["period"] = periods.roc_label(df["period"].to_numpy())
+        return df
+
+
+def is_current(datasets=None):
+    """True when the warehouse file is readable, of this schema and loaded from the current CSVs.
+
+    Read-only: a missing, corrupt or outdated file is reported, not touched.
+    """
+    if not os.path.exists(DB_PATH):
+        return False
+    try:
+        with Warehouse(DB_PATH, readonly=True) as wh:
+            return (wh.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+                    and not wh.stale(datasets))
+    except sqlite3.Error:
+        return False
+
+
+def refresh(datasets=None):
+    """Refresh the warehouse after a fetch step; reports what changed but never raises.
+
+    A file SQLite cannot read is deleted and rebuilt from data/csv.
+    """
+    try:
+        try:
+            with Warehouse(DB_PATH) as wh:
+                touched = wh.refresh(datasets)
+        except sqlite3.DatabaseError as e:
+            print(f"倉儲檔案無法讀取，由 CSV 重建：{e}")
+            os.remove(DB_PATH)
+            with Warehouse(DB_PATH) as wh:
+                touched = wh.refresh()
+    except Exception as e:
+        print(f"倉儲更新失敗（可執行 scripts/warehouse.py --rebuild 重建）：{e}")
+        return
+    for dataset, n in touched.items():
+        print(f"倉儲已更新：{dataset}（{n} 筆異動）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由 data/csv 更新本機 SQLite 倉儲並查詢")
+    parser.add_argument("--rebuild", action="store_true", help="刪除倉儲後由 CSV 全部重建")
+    parser.add_argument("--sql", help="執行 SQL 查詢並列出結果")
+    args = parser.parse_args(argv)
+
+    if args.rebuild and os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    with Warehouse(DB_PATH) as wh:
+        t0 = time.perf_counter()
+        touched = wh.refresh()
+        print(f"更新 {len(touched)} 個資料集（{time.perf_counter() - t0:.3f}s）：{touched or '皆未變更'}")
+        for table in list(TABLES) + ["mv_rate_volume"]:
+            print(f"  {table:<16}{wh.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:>6} 筆")
+
+        if args.sql:
+            print(wh.query(args.sql).to_string(index=False))
+            return 0
+
+        keys = wh.conn.execute("SELECT city, period FROM mv_rate_volume").fetchall()
+        if keys:
+            labels = list(zip(cities.labels([city for city, _ in keys], "e3030"),
+                              periods.roc_label([p for _, p in keys])))
+            t0 = time.perf_counter()
+            for city, label in labels:
+                wh.lookup(city, label)
+            per = (time.perf_counter() - t0) / len(labels)
+            print(f"單筆查詢（城市, 期別）：平均 {per * 1e6:.1f} µs（{len(labels)} 次）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cities
+
+
+@pytest.mark.parametrize("spelling", cities.SPELLINGS)
+def test_every_spelling_round_trips(spelling):
+    codes = cities.DIMENSION.index.to_numpy()
+    assert cities.encode(cities.labels(codes, spelling)).tolist() == codes.tolist()
+
+
+def test_source_spellings():
+    taipei = cities.resolve("臺北市")
+    assert cities.resolve("台北市") == taipei
+    assert cities.label(taipei, "e3030") == "台北市"
+    assert cities.label(cities.TOTAL, "statis") == "區域別總計"
+    assert cities.resolve("全國") == cities.resolve("區域別總計") == cities.TOTAL
+
+
+def test_pre_merger_names_are_former():
+    codes = cities.encode(["臺北縣(改制前)", "臺中市(99年12月24日改制前)", "臺中市"])
+    assert cities.is_former(codes).tolist() == [True, True, False]
+    assert cities.DIMENSION.at[int(codes[1]), "successor"] == codes[2]
+
+
+def test_unknown_names():
+    codes = cities.encode(["某某市", " 新竹市 ", None])
+    assert codes[0] == cities.UNKNOWN and codes[2] == cities.UNKNOWN
+    assert cities.labels(codes).tolist() == [None, "新竹市", None]
+
+
+def test_categorical_input():
+    names = pd.Series(["新北市", "台中市", "新北市"], dtype="category")
+    np.testing.assert_array_equal(cities.encode(names), cities.codes_of(["新北市", "臺中市", "新北市"]))
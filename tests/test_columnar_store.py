@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+import columnar_store
+
+pytest.importorskip("pyarrow")
+
+NAME = "taiwan_building_transfer_count"
+CSV = "資料期別,縣市,建物買賣移轉登記棟數\n113Q4,全國,70000\n114Q1,全國,65000\n"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar_store, "CSV_DIR", str(tmp_path / "csv"))
+    monkeypatch.setattr(columnar_store, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.setattr(columnar_store, "_SOURCE_HASHES", {})
+    (tmp_path / "csv").mkdir()
+    path = tmp_path / "csv" / f"{NAME}.csv"
+    path.write_text(CSV, encoding="utf-8-sig")
+    assert columnar_store.write_dataset(NAME) is not None
+    return path
+
+
+def test_unchanged_csv_is_not_hashed_again(store, monkeypatch):
+    def hashed(path):
+        raise AssertionError("hashed an unchanged CSV")
+    monkeypatch.setattr(columnar_store, "_source_sha256", hashed)
+    assert columnar_store.is_current(NAME)
+    assert columnar_store.read_dataset(NAME)["建物買賣移轉登記棟數"].tolist() == [70000, 65000]
+
+
+def test_touched_csv_is_hashed_and_still_current(store):
+    stat = store.stat()
+    os.utime(store, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert columnar_store.is_current(NAME)
+
+
+def test_edited_csv_falls_back_to_the_csv(store):
+    store.write_text(CSV.replace("65000", "165000"), encoding="utf-8-sig")
+    assert not columnar_store.is_current(NAME)
+    assert columnar_store.read_dataset(NAME)["建物買賣移轉登記棟數"].tolist() == [70000, 165000]
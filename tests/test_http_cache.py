@@ -0,0 +1,82 @@
+import time
+
+import pytest
+import requests
+
+from http_cache import CacheMiss, HttpCache
+
+URL = "https://statis.moi.gov.tw/micst/webMain.aspx?funid=c0510302&ym=09801&ymt=11406"
+
+
+def _response(status, body=b"", headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = body
+    r.headers.update(headers or {})
+    r.url = URL
+    return r
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.calls.append((url, headers or {}))
+        return self.responses.pop(0)
+
+
+def test_within_ttl_is_served_from_disk(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=3600)
+    session = FakeSession(_response(200, b"body", {"ETag": '"v1"'}))
+    assert cache.get(session, URL) == b"body"
+    assert cache.get(session, URL) == b"body"
+    assert len(session.calls) == 1
+    assert cache.stats["hit"] == 1
+
+
+def test_expired_entry_is_revalidated(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=0)
+    session = FakeSession(_response(200, b"body", {"ETag": '"v1"'}), _response(304))
+    cache.get(session, URL)
+    assert cache.get(session, URL) == b"body"
+    assert session.calls[1][1]["If-None-Match"] == '"v1"'
+    assert cache.stats["revalidated"] == 1
+
+
+def test_identical_body_without_validators_is_not_rewritten(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=0)
+    session = FakeSession(_response(200, b"body"), _response(200, b"body"), _response(200, b"new"))
+    cache.get(session, URL)
+    cache.get(session, URL)
+    assert cache.stats["unchanged"] == 1
+    assert cache.get(session, URL) == b"new"
+    assert cache.stats["downloaded"] == 2
+
+
+def test_ignored_params_share_one_entry(tmp_path):
+    HttpCache(str(tmp_path), ignore_params=("ymt",)).get(FakeSession(_response(200, b"body")), URL)
+    next_month = URL.replace("ymt=11406", "ymt=11407")
+    offline = HttpCache(str(tmp_path), offline=True, ignore_params=("ymt",))
+    assert offline.get(FakeSession(), next_month) == b"body"
+
+
+def test_offline_serves_expired_entries_and_never_connects(tmp_path):
+    HttpCache(str(tmp_path)).get(FakeSession(_response(200, b"body")), URL)
+    offline = HttpCache(str(tmp_path), ttl=0, offline=True)
+    session = FakeSession()
+    time.sleep(0.01)
+    assert offline.get(session, URL) == b"body"
+    with pytest.raises(CacheMiss):
+        offline.get(session, URL.replace("ym=09801", "ym=11001"))
+    assert session.calls == []
+
+
+def test_error_status_raises_and_is_not_cached(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    with pytest.raises(requests.HTTPError):
+        cache.get(FakeSession(_response(503, b"busy")), URL)
+    assert list(tmp_path.iterdir()) == []
+    with pytest.raises(CacheMiss):
+        HttpCache(str(tmp_path), offline=True).get(FakeSession(), URL)
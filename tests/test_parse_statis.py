@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+import fetch_transaction_trend as ftt
+from bench_parse_statis import synthetic_response
+
+HEADER = '"統計期/區域別","建物所有權登記棟數","建物所有權登記面積(平方公尺)"'
+
+
+def _response(*lines):
+    return "\r\n".join((HEADER,) + lines + ('"資料來源：內政部地政司"',)) + "\r\n"
+
+
+CASES = {
+    "regular": _response('"113年 第4季/新北市",12345,2345678.9',
+                         '"113年 第4季/臺北市",8000,1000000.01',
+                         '"114年 第1季/桃園市",0,0'),
+    "two-digit year and pre-merger counties": _response('"98年 第1季/臺北縣(改制前)",10,100',
+                                                        '"98年 第1季/台中市",20,200.5',
+                                                        '"98年 第1季/臺中縣",30,300'),
+    "placeholders": _response('"113年 第4季/新竹市",-,-', '"113年 第4季/新竹縣",5,',
+                              '"113年 第4季/苗栗縣",5'),
+    "float() spellings pandas rejects": _response('"113年 第4季/嘉義市",1_000,2_500.5',
+                                                  '"113年 第4季/嘉義縣",7,abc'),
+    "rounding ties": _response('"113年 第4季/高雄市",1,0.1', '"113年 第4季/臺南市",1,16.53',
+                               '"113年 第4季/屏東縣",1,3.3057851239669422'),
+    "duplicates keep the last": _response('"113年 第4季/宜蘭縣",1,10', '"113年 第4季/宜蘭縣",2,20'),
+    "unknown city and bare lines": _response('"113年 第4季/某某區",4,40', "no/comma here", "a,b",
+                                             '"不是期別/新北市",1,1'),
+    "extra fields": _response('"113年 第4季/新北市",1,10,x', '"113年 第4季/臺北市",2,20,x,y,z'),
+    "odd spacing and keys": _response('"113年  第4季/新北市",1,1', '" 113年 第4季 / 臺北市 ",2,2',
+                                      '"113年 第4季/桃園市 ",3,3', '"113年 第4季/a/b",4,4',
+                                      '113年 第4季/臺中市,5,5', '"113年 第4季季/臺南市",6,6'),
+    "nan and huge cells": _response('"113年 第4季/臺北市",nan,1',
+                                    '"113年 第4季/桃園市",1e30,1', '"113年 第4季/臺中市", 7 ,8'),
+    "lone carriage returns": '"113年 第4季/新北市",1,1\r"113年 第4季/臺北市",2,2\n',
+    "empty": "",
+}
+
+
+@pytest.mark.parametrize("text", CASES.values(), ids=CASES.keys())
+def test_bulk_parser_matches_line_parser(text):
+    assert ftt._frame_to_dict(ftt._parse_response_frame(text)) == ftt._parse_response(text)
+
+
+def test_bulk_parser_matches_line_parser_on_full_history():
+    text = synthetic_response(17)
+    assert ftt._frame_to_dict(ftt._parse_response_frame(text)) == ftt._parse_response(text)
+
+
+def test_bulk_parser_matches_line_parser_on_mangled_lines():
+    rng = random.Random(0)
+    lines = synthetic_response(2).splitlines()
+    for _ in range(200):
+        mangled = list(lines)
+        for i in rng.sample(range(len(mangled)), 3):
+            at = rng.randrange(len(mangled[i]) + 1)
+            mangled[i] = mangled[i][:at] + rng.choice(["/", ",", '"', "-", " ", "", "\n"]) + mangled[i][at + 1:]
+        text = "\n".join(mangled)
+        assert ftt._frame_to_dict(ftt._parse_response_frame(text)) == ftt._parse_response(text)
+
+
+def test_frame_columns_and_types():
+    df = ftt._parse_response_frame(CASES["regular"])
+    assert list(df.columns) == ["period", "city", "count", "area"]
+    assert df["period"].tolist() == ["113Q4", "113Q4", "114Q1"]
+    assert df["count"].dtype == "int64"
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+import periods
+
+
+def test_label_round_trip():
+    labels = ["098Q1", "099Q4", "100Q1", "114Q4"]
+    codes = periods.encode(labels)
+    assert codes.tolist() == [392, 399, 400, 459]
+    assert periods.roc_label(codes).tolist() == labels
+
+
+def test_codes_subtract_as_quarters():
+    a, b = periods.encode(["113Q2", "114Q2"])
+    assert b - a == 4
+    assert periods.split([a]) == ([113], [2])
+
+
+def test_invalid_labels_sort_first():
+    codes = periods.encode(["114Q1", "114Q5", None, "總計"])
+    assert codes.tolist() == [periods.parse("114Q1")] + [periods.INVALID] * 3
+    assert codes.min() == periods.INVALID
+
+
+def test_categorical_input():
+    labels = pd.Series(["114Q1", "098Q1", "114Q1"], dtype="category")
+    assert periods.encode(labels).tolist() == [456, 392, 456]
+
+
+def test_gregorian_and_period_index_round_trip():
+    codes = periods.encode(["098Q1", "114Q4"])
+    assert periods.gregorian_label(codes).tolist() == ["2009Q1", "2025Q4"]
+    index = periods.to_period_index(codes)
+    assert [str(p) for p in index] == ["2009Q1", "2025Q4"]
+    np.testing.assert_array_equal(periods.from_period_index(index), codes)
+
+
+def test_to_ym_is_first_month_of_quarter():
+    assert periods.to_ym(periods.parse("098Q1")) == "09801"
+    assert periods.to_ym(periods.parse("114Q4")) == "11410"
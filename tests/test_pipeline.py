@@ -0,0 +1,123 @@
+import argparse
+
+import pytest
+
+import common
+import pipeline
+import render_cache
+import taiwanhouse
+from pipeline import Stage
+
+
+def _fail(ctx):
+    raise RuntimeError("down")
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.delenv("GITHUB_STEP_SUMMARY", raising=False)
+    return str(tmp_path / "pipeline.json")
+
+
+def test_failed_stage_blocks_only_its_dependents(manifest):
+    stages = [
+        Stage("a", _fail),
+        Stage("a2", lambda ctx: 1, deps=["a"]),
+        Stage("a3", lambda ctx: 1, deps=["a2"]),
+        Stage("b", lambda ctx: 2),
+        Stage("b2", lambda ctx: ctx.results["b"] + 1, deps=["b"]),
+    ]
+    ctx = pipeline.run(stages, manifest_path=manifest)
+    assert ctx.status == {"a": "failed", "a2": "blocked", "a3": "blocked", "b": "ok", "b2": "ok"}
+    assert ctx.results["b2"] == 3
+
+
+def test_always_stage_runs_after_a_failed_dependency(manifest):
+    stages = [
+        Stage("a", _fail),
+        Stage("b", lambda ctx: 2),
+        Stage("end", lambda ctx: sorted(ctx.status.items()), deps=["a", "b"], always=True),
+    ]
+    ctx = pipeline.run(stages, manifest_path=manifest)
+    assert ctx.status["end"] == "ok"
+    assert ctx.results["end"] == [("a", "failed"), ("b", "ok")]
+
+
+def test_fallback_is_not_a_failure(manifest):
+    stages = [Stage("a", _fail, fallback=lambda exc: None), Stage("a2", lambda ctx: 1, deps=["a"])]
+    ctx = pipeline.run(stages, manifest_path=manifest)
+    assert ctx.status == {"a": "fallback", "a2": "ok"}
+
+
+class Fresh:
+    """Stands in for a dataset module whose download brings new data."""
+
+    CSV_OUTPUT = "unused.csv"
+    DERIVED_OUTPUTS = []
+    README_SECTIONS = ["fresh"]
+
+    @staticmethod
+    def fetch_stages(args):
+        return [Stage("fetch_fresh", lambda ctx: True, fresh=bool)]
+
+    @staticmethod
+    def derive():
+        pass
+
+    @staticmethod
+    def figure_jobs(**options):
+        return ["fresh.svg"]
+
+
+class Broken(Fresh):
+    """Stands in for a dataset module whose download fails with no existing data."""
+
+    README_SECTIONS = ["broken"]
+
+    @staticmethod
+    def fetch_stages(args):
+        return [Stage("fetch_broken", _fail)]
+
+    @staticmethod
+    def figure_jobs(**options):
+        return ["broken.svg"]
+
+
+@pytest.fixture
+def update(manifest, monkeypatch):
+    rendered, sections = [], []
+    run_stages = pipeline.run
+    monkeypatch.setattr(pipeline, "run", lambda stages, **kw: run_stages(stages, manifest_path=manifest, **kw))
+    monkeypatch.setattr(render_cache, "render_options", lambda args: {})
+    monkeypatch.setattr(render_cache, "render_figures", lambda jobs, **kw: rendered.extend(jobs))
+    monkeypatch.setattr(common, "update_readme_timestamp", sections.extend)
+
+    def run(command, **modules):
+        monkeypatch.setattr(taiwanhouse, "_module", modules.__getitem__)
+        args = argparse.Namespace(command=command, datasets=list(modules), force_stages=False,
+                                  render_workers=1, force_render=False)
+        return taiwanhouse.run(args), rendered, sections
+    return run
+
+
+def test_failed_dataset_does_not_hold_back_the_other(update):
+    exit_code, rendered, sections = update("all", good=Fresh, bad=Broken)
+    assert exit_code == 1
+    assert rendered == ["fresh.svg"]
+    assert sections == ["fresh"]
+
+
+def test_exit_codes(update):
+    assert update("all", good=Fresh)[0] == 0
+    assert update("all", bad=Broken)[0] == 2
+    assert update("plot", good=Fresh, bad=Broken)[0] == 0
+
+
+def test_hashed_stage_reruns_when_not_current(manifest):
+    runs, current = [], [True]
+    stages = [Stage("a", lambda ctx: runs.append(1), hashed=True, current=lambda: current[0])]
+    pipeline.run(stages, manifest_path=manifest)
+    assert pipeline.run(stages, manifest_path=manifest).status["a"] == "skipped"
+    current[0] = False
+    assert pipeline.run(stages, manifest_path=manifest).status["a"] == "ok"
+    assert len(runs) == 2
@@ -0,0 +1,55 @@
+import re
+
+import pytest
+
+import common
+
+pytest.importorskip("pytz")
+
+README = """# 標題
+
+### 資料視覺化- 甲
+
+
+說明文字
+#### 註
+
+
+Update time: 2026-01-01 00:00:00 CST
+
+![甲圖](a.svg)
+
+
+### 資料視覺化- 乙
+
+![乙圖](b.svg)
+### 其他
+
+Update time: 2026-01-01 00:00:00 CST
+"""
+STAMP = re.compile(r"Update time: \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} CST")
+
+
+def _update(tmp_path, sections):
+    path = tmp_path / "README.md"
+    path.write_text(README, encoding="utf-8")
+    common.update_readme_timestamp(sections, readme_path=str(path))
+    return path.read_text(encoding="utf-8")
+
+
+def test_only_the_timestamp_line_changes(tmp_path):
+    text = _update(tmp_path, [("### 資料視覺化- 甲", "![甲圖]")])
+    assert STAMP.sub("STAMP", text) == STAMP.sub("STAMP", README)
+    assert "2026-01-01" in text.split("### 其他")[1]
+
+
+def test_missing_timestamp_is_inserted_above_the_image(tmp_path):
+    text = _update(tmp_path, [("### 資料視覺化- 乙", "![乙圖]")])
+    section = text.split("### 資料視覺化- 乙\n")[1].split("### 其他")[0]
+    assert STAMP.fullmatch(section.splitlines()[1])
+    assert section.splitlines()[2:] == ["", "![乙圖](b.svg)"]
+    assert text.split("### 資料視覺化- 乙")[0] == README.split("### 資料視覺化- 乙")[0]
+
+
+def test_section_without_its_image_is_left_alone(tmp_path):
+    assert _update(tmp_path, [("### 其他", "![丙圖]")]) == README
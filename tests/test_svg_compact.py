@@ -0,0 +1,26 @@
+from svg_compact import compact_svg
+
+SVG = """<svg width="460.8pt" height="345.6pt" viewBox="0 0 460.8 345.6" version="1.1">
+ <metadata>2026-10-17</metadata>
+ <g id="PolyCollection_1">
+  <path d="M 57.6 307.584 
+L 60.123456 300.987654 
+L 62.5 299.04 
+z
+" clip-path="url(#p1)" style="fill: #2196f3; fill-opacity: 0.85; stroke: #ffffff; stroke-width: 0.25"/>
+ </g>
+</svg>
+"""
+
+
+def test_geometry_is_rounded():
+    out = compact_svg(SVG)
+    assert 'd="M 57.6 307.6 60.1 301 62.5 299 z"' in out
+    assert 'viewBox="0 0 460.8 345.6"' in out
+    assert "<metadata>" not in out
+
+
+def test_style_values_are_untouched():
+    out = compact_svg(SVG)
+    assert "fill-opacity: 0.85; stroke: #ffffff; stroke-width: 0.25" in out
+    assert 'version="1.1"' in out
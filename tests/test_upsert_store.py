@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from upsert_store import upsert_csv
+
+KEYS, VALUES = ["資料期別", "縣市"], ["rate"]
+T0, T1 = "2026-01-01 00:00:00 CST", "2026-04-01 00:00:00 CST"
+
+
+def _download(*rows):
+    return pd.DataFrame(rows, columns=KEYS + VALUES)
+
+
+def _read(path):
+    return pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+
+
+@pytest.fixture
+def stored(tmp_path):
+    path = str(tmp_path / "rates.csv")
+    counts = upsert_csv(path, _download(("113Q4", "全國", 0.21), ("113Q4", "台北市", 0.1)),
+                        KEYS, VALUES, period="資料期別", now=T0)
+    assert counts == {"inserted": 2, "changed": 0, "unchanged": 0}
+    return path
+
+
+def test_first_download_writes_the_published_header(stored):
+    assert list(_read(stored).columns) == KEYS + VALUES + ["download_timestamp", "process_timestamp"]
+
+
+def test_unchanged_download_leaves_the_file_alone(stored):
+    with open(stored, "rb") as f:
+        before = f.read()
+    counts = upsert_csv(stored, _download(("113Q4", "全國", "0.210"), ("113Q4", "台北市", 0.1)),
+                        KEYS, VALUES, period="資料期別", now=T1)
+    assert counts == {"inserted": 0, "changed": 0, "unchanged": 2}
+    with open(stored, "rb") as f:
+        assert f.read() == before
+
+
+def test_new_quarter_is_appended(stored):
+    with open(stored, "rb") as f:
+        before = f.read()
+    counts = upsert_csv(stored, _download(("113Q4", "全國", 0.21), ("114Q1", "全國", 0.25)),
+                        KEYS, VALUES, period="資料期別", now=T1)
+    assert counts == {"inserted": 1, "changed": 0, "unchanged": 1}
+    with open(stored, "rb") as f:
+        assert f.read().startswith(before)
+    row = _read(stored).iloc[-1].tolist()
+    assert row == ["114Q1", "全國", "0.25", T1, T1]
+
+
+def test_revision_rewrites_only_that_row(stored):
+    counts = upsert_csv(stored, _download(("113Q4", "全國", 0.22)),
+                        KEYS, VALUES, period="資料期別", now=T1)
+    assert counts == {"inserted": 0, "changed": 1, "unchanged": 0}
+    rows = _read(stored)
+    assert rows.values.tolist() == [["113Q4", "全國", "0.22", T0, T1],
+                                    ["113Q4", "台北市", "0.1", T0, T0]]
+
+
+def test_missing_provenance_columns_are_an_error(tmp_path):
+    path = tmp_path / "legacy.csv"
+    path.write_text("資料期別,縣市,rate\n113Q4,全國,0.21\n", encoding="utf-8-sig")
+    with pytest.raises(ValueError):
+        upsert_csv(str(path), _download(("113Q4", "全國", 0.21)), KEYS, VALUES, period="資料期別")
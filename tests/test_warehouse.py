@@ -0,0 +1,47 @@
+import pytest
+
+import columnar_store
+import warehouse
+
+NAME = "taiwan_building_transfer_count"
+CSV = "資料期別,縣市,建物買賣移轉登記棟數\n114Q4,全國,70000.0\n115Q1,全國,65000.0\n"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar_store, "CSV_DIR", str(tmp_path / "csv"))
+    monkeypatch.setattr(columnar_store, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.setattr(columnar_store, "_SOURCE_HASHES", {})
+    monkeypatch.setattr(warehouse, "DB_PATH", str(tmp_path / "warehouse.sqlite"))
+    (tmp_path / "csv").mkdir()
+    (tmp_path / "csv" / f"{NAME}.csv").write_text(CSV, encoding="utf-8-sig")
+    return tmp_path / "warehouse.sqlite"
+
+
+def _units():
+    with warehouse.Warehouse(warehouse.DB_PATH) as wh:
+        return wh.conn.execute("SELECT transfer_units FROM transfer_count ORDER BY period").fetchall()
+
+
+def test_missing_warehouse_is_not_current(db):
+    assert not warehouse.is_current()
+    assert not db.exists()
+    warehouse.refresh()
+    assert warehouse.is_current()
+    assert _units() == [(70000.0,), (65000.0,)]
+
+
+def test_changed_csv_is_not_current(db):
+    warehouse.refresh()
+    (db.parent / "csv" / f"{NAME}.csv").write_text(CSV.replace("65000", "66000"), encoding="utf-8-sig")
+    assert not warehouse.is_current()
+    warehouse.refresh()
+    assert _units() == [(70000.0,), (66000.0,)]
+
+
+def test_corrupt_warehouse_is_rebuilt(db):
+    db.write_bytes(b"not a database" * 100)
+    assert not warehouse.is_current()
+    warehouse.refresh()
+    assert warehouse.is_current()
+    assert _units() == [(70000.0,), (65000.0,)]